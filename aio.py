@@ -0,0 +1,16 @@
+# aio.py
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# googleapiclient / oauthlib / sqlite calls are blocking; async routes hand
+# them to this pool so the event loop keeps serving other requests.
+IO_WORKERS = 32
+
+io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+
+
+async def run_blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_pool, partial(fn, *args, **kwargs))
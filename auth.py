@@ -0,0 +1,206 @@
+# auth.py
+
+import base64
+import hashlib
+import hmac
+import os
+import pickle
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+
+from google.auth.transport.requests import Request as GoogleRequest
+from googleapiclient.discovery import build
+
+from db import get_account_token, get_or_create_meta, save_account_token
+
+# Tokens are refreshed this long before they expire, by a background
+# thread that wakes up every REFRESH_INTERVAL seconds.
+REFRESH_MARGIN = 300
+REFRESH_INTERVAL = 60
+
+
+# Signed session cookie naming the logged-in mailbox
+SESSION_MAX_AGE = 30 * 86400
+
+_session_secret = None
+_session_secret_lock = threading.Lock()
+
+
+# --------------------------
+# SIGNED SESSIONS
+# --------------------------
+def session_secret():
+    """
+    SESSION_SECRET from the environment, read on first use (so a .env
+    loaded after this module is imported still counts). Without one, a
+    random key is generated once and kept in the meta table, so restarts
+    and every worker on the same database accept the same cookies.
+    """
+
+    global _session_secret
+    if _session_secret is None:
+        with _session_secret_lock:
+            if _session_secret is None:
+                value = os.getenv("SESSION_SECRET") or get_or_create_meta("session_secret", secrets.token_hex(32))
+                _session_secret = value.encode()
+    return _session_secret
+
+
+def _signature(payload):
+    return hmac.new(session_secret(), payload.encode(), hashlib.sha256).hexdigest()
+
+
+def sign_session(account):
+    email = base64.urlsafe_b64encode(account.encode()).decode()
+    payload = f"{email}.{int(time.time())}"
+    return f"{payload}.{_signature(payload)}"
+
+
+def read_session(value, max_age=SESSION_MAX_AGE):
+    """
+    Returns the account a cookie from sign_session() was issued for, or
+    None if it is missing, tampered with or older than `max_age` seconds.
+    """
+
+    try:
+        email, issued, sig = value.split(".")
+        payload = f"{email}.{issued}"
+        if not hmac.compare_digest(sig, _signature(payload)):
+            return None
+        if time.time() - int(issued) > max_age:
+            return None
+        return base64.urlsafe_b64decode(email.encode()).decode()
+    except (AttributeError, ValueError):
+        return None
+
+
+def needs_refresh(creds, margin=0):
+    if not creds or not creds.refresh_token:
+        return False
+    if creds.expiry is None:
+        return not creds.valid
+    # google-auth keeps expiry as naive UTC
+    return creds.expiry - datetime.utcnow() <= timedelta(seconds=margin)
+
+
+# --------------------------
+# PROCESS-LEVEL CREDENTIAL MANAGER
+# --------------------------
+class CredentialManager:
+    """
+    Keeps credentials per account (the mailbox email) in memory, loaded
+    from the accounts table once, refreshes them ahead of expiry in the
+    background, and caches built Gmail service objects per account.
+
+    A burst of requests hitting an expired token triggers one refresh:
+    refreshes are serialized per account and re-check expiry after
+    taking the lock. Services are cached per thread, because httplib2
+    connections must not be shared between threads; each executor thread
+    builds a client once per account and reuses it afterwards.
+    """
+
+    def __init__(self, margin=REFRESH_MARGIN, interval=REFRESH_INTERVAL):
+        self.margin = margin
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.creds = {}
+        self.refresh_locks = {}
+        self.local = threading.local()
+        self.refresher = None
+
+    # ---------- storage ----------
+    def _read(self, account):
+        token = get_account_token(account)
+        return pickle.loads(token) if token else None
+
+    def _write(self, account, creds):
+        save_account_token(account, pickle.dumps(creds))
+
+    # ---------- credentials ----------
+    def login(self, creds):
+        """
+        Stores freshly issued credentials under the mailbox they belong
+        to and returns that email (the account key).
+        """
+
+        service = build("gmail", "v1", credentials=creds, cache_discovery=False)
+        email = service.users().getProfile(userId="me").execute()["emailAddress"].lower()
+
+        self._write(email, creds)
+        with self.lock:
+            self.creds[email] = creds
+        return email
+
+    def get(self, account):
+        """
+        Returns in-memory credentials for `account` (None if never logged
+        in), refreshing inline only if they already expired.
+        """
+
+        with self.lock:
+            creds = self.creds.get(account)
+            if creds is None:
+                creds = self._read(account)
+                # misses are not cached: account names come from callers
+                if creds is not None:
+                    self.creds[account] = creds
+
+        if needs_refresh(creds):
+            self.refresh(account, creds)
+
+        return creds
+
+    def refresh(self, account, creds, margin=0):
+        with self.lock:
+            lock = self.refresh_locks.setdefault(account, threading.Lock())
+
+        with lock:
+            # someone else may have refreshed while we waited
+            if not needs_refresh(creds, margin):
+                return
+            creds.refresh(GoogleRequest())
+            self._write(account, creds)
+
+    # ---------- services ----------
+    def service(self, account):
+        creds = self.get(account)
+        if not creds:
+            return None
+
+        services = getattr(self.local, "services", None)
+        if services is None:
+            services = self.local.services = {}
+
+        cached = services.get(account)
+        # a new login replaces the credentials object → rebuild
+        if cached and cached[0] is creds:
+            return cached[1]
+
+        service = build("gmail", "v1", credentials=creds, cache_discovery=False)
+        services[account] = (creds, service)
+        return service
+
+    # ---------- background refresh ----------
+    def start(self):
+        if self.refresher is None:
+            self.refresher = threading.Thread(target=self._refresh_loop, name="token-refresh", daemon=True)
+            self.refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.interval)
+
+            with self.lock:
+                items = [(a, c) for a, c in self.creds.items() if c]
+
+            for account, creds in items:
+                if needs_refresh(creds, self.margin):
+                    try:
+                        self.refresh(account, creds, self.margin)
+                    except Exception as e:
+                        print(f"Token refresh failed for {account}: {e}")
+
+
+credentials = CredentialManager()
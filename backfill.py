@@ -0,0 +1,156 @@
+# backfill.py
+
+import time
+
+from db import get_backfill, save_backfill
+from ratelimit import with_retries
+
+# messages.list returns at most 500 ids per page; one page is in flight
+# at a time, so memory stays flat however large the mailbox is
+PAGE_SIZE = 500
+LIST_RETRIES = 5
+
+# Messages of a page whose fetch or label write failed (429, quota, 5xx)
+# are retried this many times with backoff before the run stops; the
+# checkpoint never moves past a page with failures
+PAGE_RETRIES = 5
+PAGE_RETRY_DELAY = 5.0
+
+
+class PageFailed(Exception):
+    pass
+
+
+def is_gone(result):
+    # deleted since it was listed: nothing left to label, not a failure
+    return result.get("status") == 404
+
+
+# --------------------------
+# STAGE 1: PAGED ID LISTING
+# --------------------------
+def list_pages(service, user_id, page_token=None, page_size=PAGE_SIZE):
+    """
+    Yields (message_ids, next_page_token) for every page of the mailbox,
+    starting at `page_token`. next_page_token is None on the last page.
+    """
+
+    while True:
+        resp = with_retries(
+            lambda: service.users().messages().list(
+                userId=user_id, maxResults=page_size, pageToken=page_token
+            ).execute(),
+            retries=LIST_RETRIES
+        )
+
+        page_token = resp.get("nextPageToken")
+        yield [m["id"] for m in resp.get("messages", [])], page_token
+
+        if not page_token:
+            return
+
+
+# --------------------------
+# STAGE 2: FETCH → CLASSIFY → MODIFY
+# --------------------------
+def label_ids(ids, label_page, retries=PAGE_RETRIES, base_delay=PAGE_RETRY_DELAY):
+    """
+    Labels one page; ids whose result carries an "error" (fetch or label
+    write) are labeled again with backoff. Raises PageFailed if some are
+    still failing after `retries` rounds.
+
+    Returns:
+        retried, gone — ids that needed another round, ids deleted meanwhile
+    """
+
+    pending = list(ids)
+    retried, gone = set(), set()
+
+    def attempt():
+        nonlocal pending
+        results = label_page(pending)
+
+        failed = []
+        for mid, r in results.items():
+            if "error" not in r:
+                continue
+            if is_gone(r):
+                gone.add(mid)
+            else:
+                failed.append(mid)
+
+        if failed:
+            retried.update(failed)
+            pending = failed
+            raise PageFailed(f"{len(failed)} messages failed, e.g. {failed[0]}: {results[failed[0]]['error']}")
+
+    with_retries(attempt, retries=retries, base_delay=base_delay)
+    return len(retried), len(gone)
+
+
+def label_pages(pages, label_page):
+    """
+    label_page(ids) fetches, classifies and labels one page and returns
+    {message_id: result}. Yields per-page counts, not the results, so
+    nothing accumulates across pages. A page is only yielded once every
+    message on it was labeled (or no longer exists).
+    """
+
+    for ids, next_token in pages:
+        retried, gone = label_ids(ids, label_page) if ids else (0, 0)
+        yield len(ids), retried, gone, next_token
+
+
+# --------------------------
+# CHECKPOINTED RUN
+# --------------------------
+def run_backfill(service, user_id, account, label_page, progress=None, restart=False):
+    """
+    Labels every message in the mailbox, page by page. After each page
+    the next page token and running count are stored, so a crash or an
+    exhausted quota (PageFailed) resumes from the last finished page (a
+    page cut short is labeled again; adding a label twice is harmless).
+
+    progress(**data) is called after every page with the totals and the
+    throughput of this run in messages per second.
+    """
+
+    state = None if restart else get_backfill(account)
+    if state and state["done"]:
+        return {"processed": state["processed"], "done": True, "resumed": False}
+
+    page_token = state["page_token"] if state else None
+    processed = state["processed"] if state else 0
+    resumed = state is not None
+
+    started = time.monotonic()
+    this_run = retried = gone = 0
+
+    for count, page_retried, page_gone, page_token in label_pages(list_pages(service, user_id, page_token), label_page):
+        processed += count
+        this_run += count
+        retried += page_retried
+        gone += page_gone
+
+        save_backfill(account, page_token, processed, done=page_token is None)
+
+        if progress:
+            elapsed = time.monotonic() - started
+            progress(
+                processed=processed,
+                retried=retried,
+                gone=gone,
+                messages_per_sec=round(this_run / elapsed, 1) if elapsed else None,
+            )
+
+    elapsed = time.monotonic() - started
+    return {
+        "processed": processed,
+        "this_run": this_run,
+        "retried": retried,
+        "gone": gone,
+        "seconds": round(elapsed, 1),
+        "messages_per_sec": round(this_run / elapsed, 1) if elapsed else None,
+        "done": True,
+        "resumed": resumed,
+    }
@@ -0,0 +1,94 @@
+# benchmarks/bench_ai_classify.py
+#
+# Drives main.ai_classify_domains against a local stub of the Gemini
+# model with configurable latency and failure rate. Transient failures
+# are retried; batches holding a "poison" domain fail on every attempt.
+# Checks that domains from a failed batch are left out of the result and
+# the verdict table instead of being stored as not entertainment.
+#
+#   python benchmarks/bench_ai_classify.py [domains] [latency_ms] [failure_rate]
+
+import ast
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import db
+
+db.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_ai_classify.sqlite3")
+
+import main
+
+
+# --------------------------
+# STUB GEMINI (blocking, like generate_content)
+# --------------------------
+class StubModel:
+    def __init__(self, latency, failure_rate, poison=(), seed=7):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.poison = set(poison)
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    def generate_content(self, prompt):
+        domains = ast.literal_eval(prompt.rsplit("Domains:", 1)[1].strip())
+        time.sleep(self.latency)
+
+        with self.lock:
+            self.calls += 1
+            fail = bool(self.poison.intersection(domains)) or self.rnd.random() < self.failure_rate
+            self.failures += fail
+        if fail:
+            raise RuntimeError("stub model: 503 overloaded")
+
+        results = [{"domain": d, "entertainment": d.startswith("fun")} for d in domains]
+        return type("Response", (), {"text": "```json\n" + json.dumps({"results": results}) + "\n```"})()
+
+
+def main_():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.3
+    failure_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+
+    db.init_db()
+    domains = [f"{'fun' if i % 3 == 0 else 'shop'}{i}.example.com" for i in range(n)]
+
+    # every domain of the batch holding the poison one is expected to be missing
+    poison = domains[len(domains) // 2]
+    size = main.AI_BATCH_SIZE
+    poisoned = domains[domains.index(poison) // size * size:][:size]
+
+    model = StubModel(latency, failure_rate, poison=[poison])
+
+    start = time.perf_counter()
+    result = main.ai_classify_domains(domains, model=model)
+    wall = time.perf_counter() - start
+
+    stored = db.get_ai_verdicts(domains)
+    missing = set(domains) - set(result)
+    batches = [domains[i:i+size] for i in range(0, n, size)]
+    failed = [b for b in batches if missing & set(b)]
+
+    assert set(poisoned) <= missing, "failed batch leaked into the result"
+    assert all(set(b) <= missing for b in failed), "part of a failed batch was kept"
+    assert set(result) == set(stored), "a failed batch was stored"
+    assert all(result[d] == d.startswith("fun") for d in result)
+
+    print(f"domains:         {n:,} in {len(batches)} batches of {size}")
+    print(f"model calls:     {model.calls} ({model.failures} failed, retries {main.AI_MAX_RETRIES} per batch)")
+    print(f"classified:      {len(result):,} (stored {len(stored):,})")
+    print(f"left out:        {len(missing)} from {len(failed)} failed batches (incl. the one with {poison})")
+    print(f"wall:            {wall:.2f}s (includes backoff before the poisoned batch gives up)")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,138 @@
+# benchmarks/bench_batch.py
+#
+# Metadata fetches through a local fake of the Gmail discovery client
+# that counts HTTP round trips: one messages.get per id (the previous
+# loop) against gmail_batch.fetch_messages, and checks that N ids cost
+# ceil(N / BATCH_SIZE) batch requests. Some ids fail inside the batch
+# to show per-item errors.
+#
+#   python benchmarks/bench_batch.py [messages] [latency_ms] [fail_every]
+
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from gmail_batch import BATCH_SIZE, fetch_messages, parse_headers
+
+
+# --------------------------
+# FAKE GMAIL (counts round trips)
+# --------------------------
+class NotFound(Exception):
+    def __init__(self, mid):
+        super().__init__(f"Message {mid} not found")
+        self.resp = type("Resp", (), {"status": 404})()
+
+
+def fake_message(mid):
+    return {
+        "id": mid,
+        "threadId": "t-" + mid,
+        "payload": {"headers": [
+            {"name": "From", "value": f"Shop <orders@shop{mid}.example.com>"},
+            {"name": "Subject", "value": f"Order {mid} shipped"},
+        ]},
+    }
+
+
+class FakeRequest:
+    def __init__(self, gmail, mid):
+        self.gmail = gmail
+        self.mid = mid
+
+    def result(self):
+        if self.gmail.fail_every and int(self.mid[1:]) % self.gmail.fail_every == 0:
+            return None, NotFound(self.mid)
+        return fake_message(self.mid), None
+
+    def execute(self, http=None):
+        self.gmail.round_trip()
+        message, exc = self.result()
+        if exc is not None:
+            raise exc
+        return message
+
+
+class FakeBatch:
+    def __init__(self, gmail, callback):
+        self.gmail = gmail
+        self.callback = callback
+        self.items = []
+
+    def add(self, request, request_id=None):
+        self.items.append((request_id, request))
+
+    def execute(self, http=None):
+        self.gmail.round_trip()
+        for request_id, request in self.items:
+            self.callback(request_id, *request.result())
+
+
+class FakeGmail:
+    def __init__(self, latency=0.0, fail_every=0):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.round_trips = 0
+
+    def round_trip(self):
+        self.round_trips += 1
+        time.sleep(self.latency)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def get(self, userId, id, **kwargs):
+        return FakeRequest(self, id)
+
+
+# --------------------------
+# PREVIOUS IMPLEMENTATION (reference)
+# --------------------------
+def fetch_one_by_one(service, ids):
+    parsed, errors = {}, {}
+    for mid in ids:
+        try:
+            msg = service.users().messages().get(userId="me", id=mid, format="metadata").execute()
+            parsed[mid] = parse_headers(msg, ("Subject", "From"))
+        except Exception as e:
+            errors[mid] = e
+    return parsed, errors
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.02
+    fail_every = int(sys.argv[3]) if len(sys.argv) > 3 else 7
+    ids = [f"m{i}" for i in range(1, n + 1)]
+
+    legacy_gmail = FakeGmail(latency, fail_every)
+    start = time.perf_counter()
+    legacy, legacy_errors = fetch_one_by_one(legacy_gmail, ids)
+    legacy_time = time.perf_counter() - start
+
+    gmail = FakeGmail(latency, fail_every)
+    start = time.perf_counter()
+    messages, errors = fetch_messages(gmail, "me", ids)
+    batched_time = time.perf_counter() - start
+
+    expected = math.ceil(n / BATCH_SIZE)
+    assert gmail.round_trips == expected, (gmail.round_trips, expected)
+    assert set(messages) == set(legacy) and set(errors) == set(legacy_errors)
+
+    print(f"messages:        {n:,} ({len(errors)} failing)")
+    print(f"one by one:      {legacy_gmail.round_trips:5d} round trips  {legacy_time * 1000:8.1f} ms")
+    print(f"batched ({BATCH_SIZE}):    {gmail.round_trips:5d} round trips  {batched_time * 1000:8.1f} ms")
+    print(f"expected:        {expected:5d} = ceil({n} / {BATCH_SIZE})")
+
+
+if __name__ == "__main__":
+    main()
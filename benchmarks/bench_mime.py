@@ -0,0 +1,98 @@
+# benchmarks/bench_mime.py
+#
+# Body extraction on large newsletter-style emails: the previous
+# "decode first part with data + BeautifulSoup get_text" path against
+# mime_body.extract_text. Reports time, peak memory and output size.
+#
+#   python benchmarks/bench_mime.py [html_kb] [runs]
+
+import base64
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from mime_body import extract_text
+
+
+# --------------------------
+# PREVIOUS IMPLEMENTATION (reference)
+# --------------------------
+def legacy_extract(payload):
+    from bs4 import BeautifulSoup
+
+    def extract_body(p):
+        if "body" in p and "data" in p["body"]:
+            return base64.urlsafe_b64decode(p["body"]["data"]).decode("utf-8")
+        if "parts" in p:
+            for sub in p["parts"]:
+                result = extract_body(sub)
+                if result:
+                    return result
+        return ""
+
+    html = extract_body(payload)
+    return BeautifulSoup(html, "html.parser").get_text(separator="\n").strip()
+
+
+# --------------------------
+# SYNTHETIC NEWSLETTER
+# --------------------------
+def newsletter_html(kb):
+    row = (
+        "<tr><td style='padding:12px;font-family:Arial,sans-serif;color:#333'>"
+        "<a href='https://example.com/track?id=123456789&u=abcdef'>"
+        "<img src='https://cdn.example.com/img/banner.png' width='600' alt=''></a>"
+        "<p>Top story: prices drop on everything you looked at this week. "
+        "Tap to see <b>today's deals</b> before they're gone.</p></td></tr>\n"
+    )
+    head = (
+        "<html><head><style>" + ".c{color:#fff}" * 500 + "</style></head><body>"
+        "<table width='100%' cellpadding='0' cellspacing='0'>"
+    )
+    rows = row * (kb * 1024 // len(row) + 1)
+    return head + rows + "</table></body></html>"
+
+
+def encode(text):
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+def make_payload(kb, with_plain):
+    html_part = {"mimeType": "text/html", "body": {"data": encode(newsletter_html(kb))}}
+    parts = [html_part]
+    if with_plain:
+        plain = "Top story: prices drop on everything you looked at this week.\n" * (kb * 16)
+        parts.append({"mimeType": "text/plain", "body": {"data": encode(plain)}})
+    return {"mimeType": "multipart/alternative", "parts": parts}
+
+
+def measure(fn, payload, runs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(runs):
+        out = fn(payload)
+    elapsed = (time.perf_counter() - start) / runs
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, len(out)
+
+
+def main():
+    kb = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    for with_plain in (False, True):
+        payload = make_payload(kb, with_plain)
+        label = "html + text/plain" if with_plain else "html only"
+        print(f"{label} ({kb} KB html):")
+
+        for name, fn in (("legacy", legacy_extract), ("extract_text", extract_text)):
+            elapsed, peak, size = measure(fn, payload, runs)
+            print(f"  {name:<13} {elapsed * 1000:9.1f} ms   peak {peak / 2**20:7.1f} MB   {size:>9,} chars")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# benchmarks/bench_rules.py
+#
+# Compares the compiled KeywordMatcher in rules.py (per call and through
+# classify_many) with the previous linear `any(w in text ...)`
+# implementation on a synthetic corpus.
+#
+#   python benchmarks/bench_rules.py [rows]
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import db
+
+db.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_rules.sqlite3")
+
+import rules
+from rules import (
+    FINANCE_WORDS, BILL_WORDS, PROMOTION_WORDS, CAREER_WORDS, WORK_WORDS,
+    TRAVEL_WORDS, SUPPORT_WORDS, URGENT_WORDS, ENTERTAINMENT_HINTS,
+)
+
+
+# --------------------------
+# PREVIOUS IMPLEMENTATION (reference)
+# --------------------------
+def legacy_classify(subject, sender):
+    subject_l = subject.lower()
+    sender_l = sender.lower()
+
+    if any(w in subject_l or w in sender_l for w in FINANCE_WORDS):
+        return "Finance", 90, "Rule-based: Finance keywords matched"
+    if any(w in subject_l or w in sender_l for w in BILL_WORDS):
+        return "Bills", 90, "Rule-based: Bill keywords matched"
+    if any(w in subject_l for w in PROMOTION_WORDS):
+        return "Promotions/Offers", 85, "Rule-based: Promotion keywords matched"
+    if any(w in subject_l for w in CAREER_WORDS):
+        return "Career", 85, "Rule-based: Career keywords matched"
+    if any(w in subject_l for w in WORK_WORDS):
+        return "Work", 80, "Rule-based: Work keyword matched"
+    if any(w in subject_l for w in TRAVEL_WORDS):
+        return "Travel", 85, "Rule-based: Travel keyword matched"
+    if any(w in sender_l for w in SUPPORT_WORDS):
+        return "Support", 70, "Rule-based: Support sender"
+    if any(w in subject_l for w in URGENT_WORDS):
+        return "Urgent", 90, "Rule-based: Urgent keyword"
+    if "newsletter" in sender_l or "digest" in sender_l:
+        return "Newsletter", 60, "Rule-based: Newsletter sender detected"
+    if sender_l.endswith("@gmail.com"):
+        blocked = ["amazon", "flipkart", "zomato", "swiggy", "ola"]
+        if not any(b in sender_l for b in blocked):
+            return "Personal", 50, "Rule-based: Gmail personal sender"
+    if any(hint in sender_l for hint in ENTERTAINMENT_HINTS):
+        return "Entertainment", 95, "Rule-based: Known entertainment platform"
+    return "UNKNOWN_CHECK_ENTERTAINMENT", 40, "Possible entertainment domain — AI check needed"
+
+
+# --------------------------
+# SYNTHETIC CORPUS
+# --------------------------
+FILLER = (
+    "your weekly summary for the team re fwd hello there quick question about "
+    "the plan tomorrow please review attached notes thanks regards order shipped"
+).split()
+
+KEYWORDS = (
+    FINANCE_WORDS + BILL_WORDS + PROMOTION_WORDS + CAREER_WORDS + WORK_WORDS
+    + TRAVEL_WORDS + URGENT_WORDS
+)
+
+SENDERS = [
+    "alice@gmail.com", "noreply@support.example.com", "news@digest.example.org",
+    "info@netflix.com", "orders@amazon.in", "team@company.io", "hr@careers.example.com",
+    "no-reply@accounts.google.com", "offers@ola.gmail.com", "billing@utility.example.net",
+]
+
+
+def make_corpus(n, seed=7):
+    rnd = random.Random(seed)
+    subjects, senders = [], []
+
+    for _ in range(n):
+        words = [rnd.choice(FILLER) for _ in range(rnd.randint(4, 12))]
+        # Roughly half the subjects carry no keyword at all
+        if rnd.random() < 0.5:
+            words.insert(rnd.randrange(len(words) + 1), rnd.choice(KEYWORDS))
+        subject = " ".join(words)
+        subjects.append(subject.title() if rnd.random() < 0.3 else subject)
+        senders.append(rnd.choice(SENDERS))
+
+    return subjects, senders
+
+
+def run(fn, subjects, senders):
+    start = time.perf_counter()
+    out = [fn(s, f) for s, f in zip(subjects, senders)]
+    return out, time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    db.init_db()
+    rules.init_rules()
+    subjects, senders = make_corpus(n)
+
+    legacy_out, legacy_t = run(legacy_classify, subjects, senders)
+    new_out, new_t = run(rules.rule_based_classify, subjects, senders)
+
+    start = time.perf_counter()
+    cats, confs, reasons = rules.classify_many(subjects, senders)
+    bulk_t = time.perf_counter() - start
+    bulk_out = list(zip(cats, confs, reasons))
+
+    mismatches = sum(1 for a, b in zip(legacy_out, new_out) if a != b)
+    bulk_mismatches = sum(1 for a, b in zip(legacy_out, bulk_out) if a != b)
+
+    print(f"rows:        {n}")
+    print(f"legacy:      {legacy_t:.3f}s  ({n / legacy_t:,.0f} rows/s)")
+    print(f"compiled:    {new_t:.3f}s  ({n / new_t:,.0f} rows/s)")
+    print(f"bulk:        {bulk_t:.3f}s  ({n / bulk_t:,.0f} rows/s)")
+    print(f"speedup:     {legacy_t / new_t:.2f}x compiled, {legacy_t / bulk_t:.2f}x bulk")
+    print(f"mismatches:  {mismatches} compiled, {bulk_mismatches} bulk")
+
+
+if __name__ == "__main__":
+    main()
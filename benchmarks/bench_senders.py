@@ -0,0 +1,83 @@
+# benchmarks/bench_senders.py
+#
+# From-header parsing and domain lookups on a synthetic inbox: the
+# previous per-message regex + exact-domain match against senders.py
+# (memoized parser, suffix index). Reports time and how many messages
+# get a stored label.
+#
+#   python benchmarks/bench_senders.py [messages]
+
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from db import SEED_DOMAINS
+from senders import DomainIndex, extract_domain, parse_sender
+
+
+# --------------------------
+# PREVIOUS IMPLEMENTATION (reference)
+# --------------------------
+def legacy_domain(sender_raw):
+    match = re.search(r"<([^>]+)>", sender_raw)
+    email = match.group(1) if match else sender_raw
+    return email.split("@")[1].lower() if "@" in email else ""
+
+
+# --------------------------
+# SYNTHETIC INBOX
+# --------------------------
+def make_headers(n, seed=7):
+    rnd = random.Random(seed)
+    seeded = list(SEED_DOMAINS)
+    others = [f"shop{i}.example.com" for i in range(200)] + ["gmail.com"]
+    prefixes = ["", "", "mail.", "email.", "info.", "news."]
+
+    senders = []
+    for i in range(2000):
+        domain = rnd.choice(prefixes) + rnd.choice(seeded) if rnd.random() < 0.5 else rnd.choice(others)
+        senders.append(rnd.choice([
+            f"Sender {i} <no-reply@{domain}>",
+            f'"Team, {i}" <team@{domain.upper()}>',
+            f"user{i}@{domain}",
+        ]))
+
+    return [rnd.choice(senders) for _ in range(n)]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    headers = make_headers(n)
+    stored = {d.lower(): label for d, label in SEED_DOMAINS.items()}
+    index = DomainIndex(stored.items())
+
+    start = time.perf_counter()
+    legacy_hits = sum(1 for h in headers if stored.get(legacy_domain(h)))
+    legacy = time.perf_counter() - start
+
+    # resolved labels are cached per domain, as DomainLabelStore.get does
+    resolved = {}
+
+    def label_of(domain):
+        try:
+            return resolved[domain]
+        except KeyError:
+            label = resolved[domain] = index.lookup(domain)
+            return label
+
+    start = time.perf_counter()
+    hits = sum(1 for h in headers if label_of(extract_domain(parse_sender(h))))
+    new = time.perf_counter() - start
+
+    print(f"messages:        {n:,}")
+    print(f"legacy exact:    {legacy * 1000:8.1f} ms   labeled {legacy_hits:,}")
+    print(f"senders suffix:  {new * 1000:8.1f} ms   labeled {hits:,}")
+    print(f"speedup:         {legacy / new:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# benchmarks/load_test.py
+#
+# Fires concurrent /draft/{id} requests at the ASGI app with Gmail and
+# Gemini replaced by local stubs that only sleep, and compares the wall
+# time with what the same requests cost back to back.
+#
+#   python benchmarks/load_test.py [requests] [gmail_ms] [model_ms]
+
+import asyncio
+import base64
+import os
+import sys
+import tempfile
+import time
+from email.utils import formatdate
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import db
+
+db.DB_PATH = os.path.join(tempfile.mkdtemp(), "load_test.sqlite3")
+
+import draft
+import main
+
+
+# --------------------------
+# STUB GMAIL (blocking, like googleapiclient)
+# --------------------------
+def stub_message(mid):
+    body = base64.urlsafe_b64encode(b"Hi, can we meet tomorrow?").decode()
+    return {
+        "id": mid,
+        "threadId": "t-" + mid,
+        "payload": {
+            "mimeType": "text/plain",
+            "headers": [
+                {"name": "From", "value": "Friend <friend@gmail.com>"},
+                {"name": "Subject", "value": "Catch up"},
+                {"name": "Date", "value": formatdate(localtime=True)},
+            ],
+            "body": {"data": body},
+        },
+    }
+
+
+class StubRequest:
+    def __init__(self, latency, result):
+        self.latency = latency
+        self.result = result
+
+    def execute(self, http=None):
+        time.sleep(self.latency)
+        return self.result
+
+
+class StubBatch:
+    def __init__(self, latency, callback):
+        self.latency = latency
+        self.callback = callback
+        self.items = []
+
+    def add(self, request, request_id=None):
+        self.items.append((request_id, request))
+
+    def execute(self, http=None):
+        time.sleep(self.latency)
+        for request_id, request in self.items:
+            self.callback(request_id, request.result, None)
+
+
+class StubGmail:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def new_batch_http_request(self, callback=None):
+        return StubBatch(self.latency, callback)
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def drafts(self):
+        return self
+
+    def threads(self):
+        return StubThreads(self.latency)
+
+    def get(self, userId, id, **kwargs):
+        return StubRequest(self.latency, stub_message(id))
+
+    def create(self, userId, body):
+        return StubRequest(self.latency, {"id": "draft-" + body["message"]["threadId"]})
+
+
+class StubThreads:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def get(self, userId, id, **kwargs):
+        return StubRequest(self.latency, {"id": id, "messages": [stub_message(id[2:])]})
+
+
+# --------------------------
+# STUB GEMINI (async)
+# --------------------------
+class StubModel:
+    latency = 0.5
+
+    def __init__(self, name):
+        self.name = name
+
+    async def generate_content_async(self, prompt):
+        await asyncio.sleep(self.latency)
+        return type("Response", (), {"text": "Sounds good, see you then."})()
+
+
+# --------------------------
+# MINIMAL ASGI CLIENT
+# --------------------------
+async def get(app, path, cookie=""):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "headers": [(b"cookie", cookie.encode())],
+        "client": ("127.0.0.1", 0), "server": ("localhost", 8080),
+    }
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+async def run(n, gmail_latency, model_latency):
+    StubModel.latency = model_latency
+    main.credentials.get = lambda account: object()
+    main.credentials.service = lambda account: StubGmail(gmail_latency)
+    draft.genai.GenerativeModel = StubModel
+    main.init_db()
+
+    # metadata fetch (1 batch) + threads.get + model + draft create
+    per_request = 3 * gmail_latency + model_latency
+
+    start = time.perf_counter()
+    cookie = f"{main.SESSION_COOKIE}={main.sign_session('load@test')}"
+    statuses = await asyncio.gather(*(get(main.app, f"/draft/m{i}", cookie) for i in range(n)))
+    wall = time.perf_counter() - start
+
+    print(f"requests:         {n}")
+    print(f"status codes:     {sorted(set(statuses))}")
+    print(f"one request:      ~{per_request:.2f}s (stub latencies)")
+    print(f"back to back:     ~{n * per_request:.2f}s")
+    print(f"concurrent wall:  {wall:.2f}s")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    gmail_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    model_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 500
+    asyncio.run(run(n, gmail_ms / 1000, model_ms / 1000))
@@ -4,6 +4,8 @@ import os
 import json
 import google.generativeai as genai
 
+from db import get_ai_verdicts, save_ai_verdicts
+
 # Configure Gemini API
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
@@ -17,8 +19,11 @@ def ai_check_entertainment(domain: str) -> bool:
         - Safe JSON extraction
     """
 
-    model = genai.GenerativeModel("models/gemini-2.5-flash")
+    cached = get_ai_verdicts([domain])
+    if domain.lower() in cached:
+        return cached[domain.lower()]
 
+    model = genai.GenerativeModel("models/gemini-2.5-flash")
 
     prompt = f"""
 You are a domain classifier.
@@ -49,7 +54,10 @@ Respond ONLY as valid JSON:
 
         data = json.loads(raw)
 
-        return data.get("entertainment", False)
+        verdict = bool(data.get("entertainment", False))
+        save_ai_verdicts({domain: verdict})
+
+        return verdict
 
     except Exception as e:
         # If AI fails → default to False (safe)
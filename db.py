@@ -1,29 +1,819 @@
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timedelta
+
+from senders import DomainIndex, is_valid_domain, normalize_domain
 
 DB_PATH = "db.sqlite3"
 
+# AI entertainment verdicts: positives change rarely, negatives are
+# re-checked sooner in case the model got a new domain wrong.
+VERDICT_TTL = 30 * 86400
+NEGATIVE_VERDICT_TTL = 7 * 86400
+
+# Generated replies: unused entries expire, and the table is capped
+REPLY_CACHE_TTL = 30 * 86400
+REPLY_CACHE_MAX = 5000
+
+# A draft claim whose draft never got recorded (crashed process) can be
+# taken again after this many seconds
+DRAFT_CLAIM_TTL = 600
+
+# Rows per page of domain listings
+DOMAIN_PAGE_SIZE = 100
+
+# Bulk import/export: rows per executemany call / per fetchmany
+IMPORT_CHUNK = 5000
+EXPORT_CHUNK = 1000
+
+# Seconds a write waits for another connection's transaction (a bulk
+# import holds the write lock until it commits) before "database is locked"
+BUSY_TIMEOUT = 60
+
+# Seconds between checks for commits made by other processes (CLI imports)
+EXTERNAL_CHECK_INTERVAL = 5.0
+
+# Conflict policy for imports: a row only replaces one of equal or lower rank
+SOURCE_RANK = {"manual": 3, "seed": 2, "ai": 1}
+
+
+# ---------------------------------
+# DOMAIN → LABEL STORE
+# ---------------------------------
+class DomainLabelStore:
+    """
+    Keeps two long-lived SQLite connections (WAL mode) instead of opening
+    a new one per call: reads go through `conn` under `lock`, writes
+    through `write_conn` under `write_lock`. A write waiting for another
+    connection's transaction (a bulk import) only holds write_lock, so
+    reads never queue behind it.
+
+    Lookups go through a suffix index of all stored domains, so
+    "mail.netflix.com" gets the label of "netflix.com" unless it has its
+    own row, and through an in-memory cache of resolved domain → label
+    (misses are cached as None), so lookups in the labeling loop are
+    dict hits. Saving or deleting one domain patches the index in
+    place and clears the cache; bulk writes (seed, import) and commits
+    from other processes drop the index, which is rebuilt on the next
+    lookup. Commits from other connections (imports, domains_cli.py)
+    are noticed through PRAGMA data_version, checked at most every
+    EXTERNAL_CHECK_INTERVAL seconds.
+
+    Lock order: write_lock before lock, never the other way round.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.lock = threading.RLock()
+        self.write_lock = threading.RLock()
+        self._index_lock = threading.Lock()
+        self.write_conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.write_conn.execute("PRAGMA journal_mode=WAL")
+        self.write_conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._labels = {}
+        self._index = None
+        self._generation = 0  # bumped by every write that can change a label
+        self._data_version = None
+        self._checked = 0.0
+
+    def create_tables(self):
+        with self.write_lock:
+            self.write_conn.execute("""
+            CREATE TABLE IF NOT EXISTS domain_labels (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                domain TEXT UNIQUE,
+                label TEXT,
+                source TEXT,
+                created_at TEXT
+            )
+            """)
+            # filtered listings walk these in domain order (keyset pagination)
+            self.write_conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_domain_labels_label ON domain_labels (label, domain)"
+            )
+            self.write_conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_domain_labels_source ON domain_labels (source, domain)"
+            )
+            self.write_conn.execute("""
+            CREATE TABLE IF NOT EXISTS ai_verdicts (
+                domain TEXT PRIMARY KEY,
+                entertainment INTEGER,
+                checked_at REAL
+            )
+            """)
+            self.write_conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                account TEXT,
+                stream TEXT,
+                history_id TEXT,
+                updated_at TEXT,
+                PRIMARY KEY (account, stream)
+            )
+            """)
+            self.write_conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_failures (
+                account TEXT,
+                stream TEXT,
+                message_id TEXT,
+                attempts INTEGER,
+                error TEXT,
+                updated_at TEXT,
+                PRIMARY KEY (account, stream, message_id)
+            )
+            """)
+            self.write_conn.execute("""
+            CREATE TABLE IF NOT EXISTS reply_cache (
+                key TEXT PRIMARY KEY,
+                reply TEXT,
+                created_at REAL,
+                used_at REAL
+            )
+            """)
+            # message ids are only unique per mailbox; the first version of
+            # this table was keyed by message id alone and cannot say whose
+            # draft a row was, so it is dropped
+            columns = [row[1] for row in self.write_conn.execute("PRAGMA table_info(message_drafts)")]
+            if columns and "account" not in columns:
+                self.write_conn.execute("DROP TABLE message_drafts")
+            self.write_conn.execute("""
+            CREATE TABLE IF NOT EXISTS message_drafts (
+                account TEXT,
+                message_id TEXT,
+                draft_id TEXT,
+                reply_key TEXT,
+                created_at TEXT,
+                PRIMARY KEY (account, message_id)
+            )
+            """)
+            self.write_conn.execute("""
+            CREATE TABLE IF NOT EXISTS accounts (
+                email TEXT PRIMARY KEY,
+                token BLOB,
+                updated_at TEXT
+            )
+            """)
+            self.write_conn.execute("""
+            CREATE TABLE IF NOT EXISTS gmail_labels (
+                account TEXT,
+                name TEXT,
+                label_id TEXT,
+                PRIMARY KEY (account, name)
+            )
+            """)
+            self.write_conn.execute("""
+            CREATE TABLE IF NOT EXISTS backfill_state (
+                account TEXT PRIMARY KEY,
+                page_token TEXT,
+                processed INTEGER,
+                done INTEGER,
+                updated_at TEXT
+            )
+            """)
+            self.write_conn.execute("""
+            CREATE TABLE IF NOT EXISTS rules (
+                category TEXT PRIMARY KEY,
+                position INTEGER,
+                confidence INTEGER,
+                reason TEXT,
+                scopes TEXT
+            )
+            """)
+            self.write_conn.execute("""
+            CREATE TABLE IF NOT EXISTS rule_keywords (
+                category TEXT,
+                keyword TEXT,
+                PRIMARY KEY (category, keyword)
+            )
+            """)
+            self.write_conn.execute("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+            """)
+            self.write_conn.commit()
+
+    def get_meta(self, key: str):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _write_meta(self, key: str):
+        # read on the write connection, inside the caller's write_lock
+        row = self.write_conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def get_or_create_meta(self, key: str, value: str):
+        # first writer wins; everyone reads back the stored value
+        with self.write_lock:
+            self.write_conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)", (key, value))
+            self.write_conn.commit()
+            return self._write_meta(key)
+
+    def seed(self, domains: dict, version: int):
+        """
+        Inserts seed rows in a single transaction, once per seed version.
+        Existing rows keep their rowid and created_at; only rows that are
+        still owned by the seed get their label updated, so manual edits
+        to a seeded domain survive.
+        """
+
+        with self.write_lock:
+            if self._write_meta("seed_version") == str(version):
+                return False
+
+            now = datetime.utcnow().isoformat()
+            with self.write_conn:
+                self.write_conn.executemany("""
+                INSERT INTO domain_labels (domain, label, source, created_at)
+                VALUES (?, ?, 'seed', ?)
+                ON CONFLICT(domain) DO UPDATE SET label = excluded.label
+                WHERE domain_labels.source = 'seed' AND domain_labels.label != excluded.label
+                """, [(d.lower(), label, now) for d, label in domains.items()])
+
+                self.write_conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('seed_version', ?)",
+                    (str(version),)
+                )
+
+            with self.lock:
+                self._invalidate()
+            return True
+
+    def _invalidate(self):
+        # a row can decide the label of every subdomain below it
+        self._labels.clear()
+        self._index = None
+        self._generation += 1
+
+    def _patch_index(self, domain, label=None):
+        # one row changed (label None = deleted): update the index in place
+        if self._index is not None:
+            if label is None:
+                self._index.remove(domain)
+            else:
+                self._index.add(domain, label)
+        self._labels.clear()
+        self._generation += 1
+
+    def _check_external(self):
+        # data_version of the write connection moves with every commit but
+        # its own. Skipped while a write is in flight (it may be waiting on
+        # an import for a long time); the next lookup checks again.
+        if not self.write_lock.acquire(blocking=False):
+            return
+        try:
+            version = self.write_conn.execute("PRAGMA data_version").fetchone()[0]
+            with self.lock:
+                if version != self._data_version:
+                    self._data_version = version
+                    self._invalidate()
+                self._checked = time.monotonic()
+        finally:
+            self.write_lock.release()
+
+    def _domain_index(self):
+        index = self._index
+        while index is None:
+            # one builder at a time, on its own connection: other reads do
+            # not wait for a rebuild of a large table
+            with self._index_lock:
+                if self._index is None:
+                    generation = self._generation
+                    conn = sqlite3.connect(self.path)
+                    try:
+                        built = DomainIndex(conn.execute("SELECT domain, label FROM domain_labels"))
+                    finally:
+                        conn.close()
+                    with self.lock:
+                        # a write landed meanwhile and may be missing: build again
+                        if self._generation == generation:
+                            self._index = built
+                index = self._index
+        return index
+
+    # ---------- keyword rules ----------
+    def _bump_rules_version(self):
+        # caller holds write_lock and an open transaction
+        self.write_conn.execute("""
+        INSERT INTO meta (key, value) VALUES ('rules_version', '1')
+        ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+        """)
+
+    def seed_rules(self, rules, version: int):
+        """
+        rules = [(category, confidence, reason, keywords, scopes), ...] in
+        priority order. Applied once per seed version: rule rows are
+        upserted and their keywords added; keywords removed by hand are
+        only restored by a new seed version.
+        """
+
+        with self.write_lock:
+            if self._write_meta("rules_seed_version") == str(version):
+                return False
+
+            with self.write_conn:
+                self.write_conn.executemany("""
+                INSERT OR REPLACE INTO rules (category, position, confidence, reason, scopes)
+                VALUES (?, ?, ?, ?, ?)
+                """, [
+                    (category, pos, conf, reason, ",".join(scopes))
+                    for pos, (category, conf, reason, _, scopes) in enumerate(rules)
+                ])
+                self.write_conn.executemany(
+                    "INSERT OR IGNORE INTO rule_keywords (category, keyword) VALUES (?, ?)",
+                    [(rule[0], w.lower()) for rule in rules for w in rule[3]]
+                )
+                self.write_conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('rules_seed_version', ?)",
+                    (str(version),)
+                )
+                self._bump_rules_version()
+            return True
+
+    def get_rules_version(self):
+        return int(self.get_meta("rules_version") or 0)
+
+    def get_rules(self):
+        """
+        Returns:
+            version, [(category, confidence, reason, keywords, scopes), ...]
+            in priority order, read in one snapshot
+        """
+
+        with self.lock:
+            version = self.get_rules_version()
+            rows = self.conn.execute(
+                "SELECT category, confidence, reason, scopes FROM rules ORDER BY position"
+            ).fetchall()
+            keywords = {}
+            for category, keyword in self.conn.execute(
+                "SELECT category, keyword FROM rule_keywords ORDER BY keyword"
+            ):
+                keywords.setdefault(category, []).append(keyword)
+
+        rules = [
+            (category, conf, reason, keywords.get(category, []), tuple(filter(None, scopes.split(","))))
+            for category, conf, reason, scopes in rows
+        ]
+        return version, rules
+
+    def add_rule_keyword(self, category: str, keyword: str):
+        """
+        Raises ValueError for an empty keyword (it would match every text),
+        an unknown category, or a rule with no scopes (nothing would ever
+        be matched against its keywords, e.g. Personal).
+        """
+
+        keyword = keyword.strip().lower()
+        if not keyword:
+            raise ValueError("Keyword must not be empty")
+
+        with self.write_lock:
+            row = self.write_conn.execute("SELECT scopes FROM rules WHERE category = ?", (category,)).fetchone()
+            if row is None:
+                raise ValueError(f"Unknown category {category!r}")
+            if not row[0]:
+                raise ValueError(f"Category {category!r} does not match keywords")
+
+            with self.write_conn:
+                self.write_conn.execute(
+                    "INSERT OR IGNORE INTO rule_keywords (category, keyword) VALUES (?, ?)",
+                    (category, keyword)
+                )
+                self._bump_rules_version()
+
+    def delete_rule_keyword(self, category: str, keyword: str):
+        with self.write_lock:
+            with self.write_conn:
+                self.write_conn.execute(
+                    "DELETE FROM rule_keywords WHERE category = ? AND keyword = ?",
+                    (category, keyword.strip().lower())
+                )
+                self._bump_rules_version()
+
+    # ---------- domain labels ----------
+    def get(self, domain: str):
+        """Label of `domain` or of its most specific stored parent domain."""
+
+        if time.monotonic() - self._checked > EXTERNAL_CHECK_INTERVAL:
+            self._check_external()
+
+        domain = normalize_domain(domain)
+        try:
+            return self._labels[domain]
+        except KeyError:
+            pass
+
+        generation = self._generation
+        index = self._domain_index()
+        label = index.lookup(domain) if domain else None
+
+        with self.lock:
+            # not cached if a write changed the index meanwhile
+            if self._generation == generation:
+                self._labels[domain] = label
+        return label
+
+    def save(self, domain: str, label: str, source: str = "manual"):
+        """Raises ValueError for a malformed domain or an empty label."""
+
+        domain = normalize_domain(domain)
+        if not is_valid_domain(domain):
+            raise ValueError(f"Invalid domain {domain!r}")
+        label = label.strip()
+        if not label:
+            raise ValueError("Label must not be empty")
+
+        with self.write_lock:
+            self.write_conn.execute("""
+            INSERT OR REPLACE INTO domain_labels (domain, label, source, created_at)
+            VALUES (?, ?, ?, ?)
+            """, (domain, label, source, datetime.utcnow().isoformat()))
+            self.write_conn.commit()
+            with self.lock:
+                self._patch_index(domain, label)
+
+    def delete(self, domain: str):
+        domain = normalize_domain(domain)
+        with self.write_lock:
+            self.write_conn.execute("DELETE FROM domain_labels WHERE domain = ?", (domain,))
+            self.write_conn.commit()
+            with self.lock:
+                self._patch_index(domain)
+
+    def all(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT domain, label, source FROM domain_labels"
+            ).fetchall()
+
+    def page(self, after=None, limit=DOMAIN_PAGE_SIZE, label=None, source=None, prefix=None):
+        """
+        Returns up to `limit` (domain, label, source) rows in domain order,
+        starting after domain `after`. Keyset pagination: every page is an
+        index range scan, however deep into the table it is.
+
+        prefix limits rows to domains starting with it (a range on the
+        domain index, not a LIKE scan).
+        """
+
+        where, params = [], []
+
+        if after:
+            where.append("domain > ?")
+            params.append(after.lower())
+        if prefix:
+            prefix = prefix.lower()
+            where.append("domain >= ? AND domain < ?")
+            params += [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+        if label:
+            where.append("label = ?")
+            params.append(label)
+        if source:
+            where.append("source = ?")
+            params.append(source)
+
+        sql = "SELECT domain, label, source FROM domain_labels"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY domain LIMIT ?"
+        params.append(limit)
+
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def import_rows(self, rows, chunk=IMPORT_CHUNK):
+        """
+        rows = iterable of (domain, label, source), source one of
+        SOURCE_RANK. Upserts everything in one transaction, `chunk` rows per
+        executemany. An existing row is only replaced by one whose source
+        ranks the same or higher (manual > seed > ai).
+
+        Runs on its own connection: the store locks are only taken at the
+        end to drop the caches, so lookups and other reads carry on during
+        the import (WAL). Other writes wait for the commit, holding only
+        write_lock.
+
+        Returns the number of rows inserted or changed.
+        """
+
+        rank = " ".join(f"WHEN '{src}' THEN {r}" for src, r in SOURCE_RANK.items())
+        sql = f"""
+        INSERT INTO domain_labels (domain, label, source, created_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(domain) DO UPDATE SET
+            label = excluded.label, source = excluded.source, created_at = excluded.created_at
+        WHERE (CASE excluded.source {rank} ELSE 0 END) >= (CASE domain_labels.source {rank} ELSE 0 END)
+            AND (domain_labels.label IS NOT excluded.label OR domain_labels.source IS NOT excluded.source)
+        """
+
+        now = datetime.utcnow().isoformat()
+        batch = []
+
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+        try:
+            with conn:
+                for domain, label, source in rows:
+                    batch.append((domain, label, source, now))
+                    if len(batch) >= chunk:
+                        conn.executemany(sql, batch)
+                        batch = []
+                if batch:
+                    conn.executemany(sql, batch)
+            changed = conn.total_changes
+        finally:
+            conn.close()
+
+        with self.write_lock:
+            version = self.write_conn.execute("PRAGMA data_version").fetchone()[0]
+            with self.lock:
+                self._invalidate()
+                # the import's commit is already covered: no second rebuild
+                self._data_version = version
+        return changed
+
+    def iter_rows(self, label=None, source=None, chunk=EXPORT_CHUNK):
+        """
+        Yields lists of (domain, label, source) rows in domain order,
+        `chunk` at a time, from a cursor on a separate read connection:
+        the export reads one consistent snapshot without holding the
+        store lock or blocking writers (WAL).
+        """
+
+        where, params = [], []
+        if label:
+            where.append("label = ?")
+            params.append(label)
+        if source:
+            where.append("source = ?")
+            params.append(source)
+
+        sql = "SELECT domain, label, source FROM domain_labels"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY domain"
+
+        # consumed from whichever pool thread runs the next step
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            conn.close()
+
+    def get_verdicts(self, domains, ttl=VERDICT_TTL, negative_ttl=NEGATIVE_VERDICT_TTL):
+        """
+        Returns {domain: bool} for domains with a verdict that has not
+        expired yet. Unknown or stale domains are left out.
+        """
+
+        domains = [d.lower() for d in domains]
+        now = time.time()
+        found = {}
+
+        with self.lock:
+            for i in range(0, len(domains), 500):
+                chunk = domains[i:i+500]
+                rows = self.conn.execute(
+                    "SELECT domain, entertainment, checked_at FROM ai_verdicts "
+                    f"WHERE domain IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+
+                for domain, ent, checked_at in rows:
+                    if now - checked_at < (ttl if ent else negative_ttl):
+                        found[domain] = bool(ent)
+
+        return found
+
+    def save_verdicts(self, verdicts: dict):
+        now = time.time()
+        with self.write_lock:
+            with self.write_conn:
+                self.write_conn.executemany(
+                    "INSERT OR REPLACE INTO ai_verdicts (domain, entertainment, checked_at) VALUES (?, ?, ?)",
+                    [(d.lower(), int(bool(v)), now) for d, v in verdicts.items()]
+                )
+
+    def get_history_id(self, account: str, stream: str):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT history_id FROM sync_state WHERE account = ? AND stream = ?",
+                (account.lower(), stream)
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_history_id(self, account: str, stream: str, history_id):
+        with self.write_lock:
+            self.write_conn.execute("""
+            INSERT OR REPLACE INTO sync_state (account, stream, history_id, updated_at)
+            VALUES (?, ?, ?, ?)
+            """, (account.lower(), stream, str(history_id), datetime.utcnow().isoformat()))
+            self.write_conn.commit()
+
+    def record_sync_failures(self, account: str, stream: str, errors: dict):
+        """
+        errors = {message_id: error text}. Counts one more failed run for
+        each message and returns {message_id: failed runs so far}.
+        """
+
+        account = account.lower()
+        now = datetime.utcnow().isoformat()
+        with self.write_lock:
+            with self.write_conn:
+                self.write_conn.executemany("""
+                INSERT INTO sync_failures (account, stream, message_id, attempts, error, updated_at)
+                VALUES (?, ?, ?, 1, ?, ?)
+                ON CONFLICT(account, stream, message_id) DO UPDATE SET
+                    attempts = attempts + 1, error = excluded.error, updated_at = excluded.updated_at
+                """, [(account, stream, mid, str(err), now) for mid, err in errors.items()])
+            rows = self.write_conn.execute(
+                "SELECT message_id, attempts FROM sync_failures WHERE account = ? AND stream = ?",
+                (account, stream)
+            ).fetchall()
+        return {mid: attempts for mid, attempts in rows if mid in errors}
+
+    def get_parked_messages(self, account: str, stream: str, max_attempts: int):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT message_id FROM sync_failures WHERE account = ? AND stream = ? AND attempts >= ?",
+                (account.lower(), stream, max_attempts)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def clear_sync_failures(self, account: str, stream: str, max_attempts: int):
+        # the stream moved past them: counts of messages not parked are moot
+        with self.write_lock:
+            self.write_conn.execute(
+                "DELETE FROM sync_failures WHERE account = ? AND stream = ? AND attempts < ?",
+                (account.lower(), stream, max_attempts)
+            )
+            self.write_conn.commit()
+
+    def get_backfill(self, account: str):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT page_token, processed, done FROM backfill_state WHERE account = ?",
+                (account.lower(),)
+            ).fetchone()
+        if not row:
+            return None
+        return {"page_token": row[0], "processed": row[1], "done": bool(row[2])}
+
+    def save_backfill(self, account: str, page_token, processed: int, done: bool):
+        with self.write_lock:
+            self.write_conn.execute("""
+            INSERT OR REPLACE INTO backfill_state (account, page_token, processed, done, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            """, (account.lower(), page_token, processed, int(done), datetime.utcnow().isoformat()))
+            self.write_conn.commit()
+
+    def get_reply(self, key: str):
+        with self.lock:
+            row = self.conn.execute("SELECT reply FROM reply_cache WHERE key = ?", (key,)).fetchone()
+        if row:
+            with self.write_lock:
+                self.write_conn.execute("UPDATE reply_cache SET used_at = ? WHERE key = ?", (time.time(), key))
+                self.write_conn.commit()
+        return row[0] if row else None
+
+    def save_reply(self, key: str, reply: str, ttl=REPLY_CACHE_TTL, max_rows=REPLY_CACHE_MAX):
+        now = time.time()
+        with self.write_lock:
+            with self.write_conn:
+                self.write_conn.execute(
+                    "INSERT OR REPLACE INTO reply_cache (key, reply, created_at, used_at) VALUES (?, ?, ?, ?)",
+                    (key, reply, now, now)
+                )
+                # evict: expired first, then least recently used beyond the cap
+                self.write_conn.execute("DELETE FROM reply_cache WHERE used_at < ?", (now - ttl,))
+                self.write_conn.execute("""
+                DELETE FROM reply_cache WHERE key IN (
+                    SELECT key FROM reply_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?
+                )
+                """, (max_rows,))
+
+    def get_message_draft(self, account: str, message_id: str):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT draft_id, reply_key FROM message_drafts WHERE account = ? AND message_id = ?",
+                (account.lower(), message_id)
+            ).fetchone()
+        return row
+
+    def claim_message_draft(self, account: str, message_id: str, ttl=DRAFT_CLAIM_TTL):
+        """
+        Inserts a pending row (no draft_id yet) for the account's message.
+        Returns True if this caller got the claim; False if a draft exists
+        or another caller is creating one.
+        """
+
+        account = account.lower()
+        now = datetime.utcnow()
+        stale = (now - timedelta(seconds=ttl)).isoformat()
+        with self.write_lock:
+            with self.write_conn:
+                self.write_conn.execute(
+                    "DELETE FROM message_drafts "
+                    "WHERE account = ? AND message_id = ? AND draft_id IS NULL AND created_at < ?",
+                    (account, message_id, stale)
+                )
+                cur = self.write_conn.execute(
+                    "INSERT OR IGNORE INTO message_drafts (account, message_id, draft_id, reply_key, created_at) "
+                    "VALUES (?, ?, NULL, NULL, ?)",
+                    (account, message_id, now.isoformat())
+                )
+            return cur.rowcount == 1
+
+    def release_message_draft(self, account: str, message_id: str):
+        # drop a claim that did not lead to a draft, so a later run retries
+        with self.write_lock:
+            self.write_conn.execute(
+                "DELETE FROM message_drafts WHERE account = ? AND message_id = ? AND draft_id IS NULL",
+                (account.lower(), message_id)
+            )
+            self.write_conn.commit()
+
+    def save_message_draft(self, account: str, message_id: str, draft_id: str, reply_key: str):
+        with self.write_lock:
+            self.write_conn.execute(
+                "INSERT OR REPLACE INTO message_drafts (account, message_id, draft_id, reply_key, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (account.lower(), message_id, draft_id, reply_key, datetime.utcnow().isoformat())
+            )
+            self.write_conn.commit()
+
+    def get_token(self, email: str):
+        with self.lock:
+            row = self.conn.execute("SELECT token FROM accounts WHERE email = ?", (email.lower(),)).fetchone()
+        return row[0] if row else None
+
+    def save_token(self, email: str, token: bytes):
+        with self.write_lock:
+            self.write_conn.execute(
+                "INSERT OR REPLACE INTO accounts (email, token, updated_at) VALUES (?, ?, ?)",
+                (email.lower(), token, datetime.utcnow().isoformat())
+            )
+            self.write_conn.commit()
+
+    def list_accounts(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT email FROM accounts ORDER BY email")]
+
+    def get_label_ids(self, account: str):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT name, label_id FROM gmail_labels WHERE account = ?", (account.lower(),)
+            ).fetchall()
+        return dict(rows)
+
+    def save_label_ids(self, account: str, label_ids: dict, replace: bool = False):
+        """
+        label_ids = {label name (lowercase): Gmail label id}. With
+        replace=True the account's stored mapping is swapped for this one.
+        """
+
+        account = account.lower()
+        with self.write_lock:
+            with self.write_conn:
+                if replace:
+                    self.write_conn.execute("DELETE FROM gmail_labels WHERE account = ?", (account,))
+                self.write_conn.executemany(
+                    "INSERT OR REPLACE INTO gmail_labels (account, name, label_id) VALUES (?, ?, ?)",
+                    [(account, name.lower(), label_id) for name, label_id in label_ids.items()]
+                )
+
+    def clear_cache(self):
+        with self.lock:
+            self._invalidate()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DomainLabelStore(DB_PATH)
+    return _store
+
 
 # ---------------------------------
 # INIT DB + SEED DEFAULT DOMAINS
+# (called from the app startup hook, not at import time)
 # ---------------------------------
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS domain_labels (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        domain TEXT UNIQUE,
-        label TEXT,
-        source TEXT,
-        created_at TEXT
-    )
-    """)
-
-    conn.commit()
-    conn.close()
-
+    get_store().create_tables()
     seed_initial_domains()
 
 
@@ -31,105 +821,225 @@ def init_db():
 # INSERT / UPDATE DOMAIN → LABEL
 # ---------------------------------
 def save_domain_label(domain: str, label: str, source: str = "manual"):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    INSERT OR REPLACE INTO domain_labels (domain, label, source, created_at)
-    VALUES (?, ?, ?, ?)
-    """, (domain.lower(), label, source, datetime.utcnow().isoformat()))
-
-    conn.commit()
-    conn.close()
+    get_store().save(domain, label, source)
 
 
 # ---------------------------------
 # GET LABEL FOR DOMAIN
 # ---------------------------------
 def get_domain_label(domain: str):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT label FROM domain_labels WHERE domain = ?", (domain.lower(),))
-    row = cursor.fetchone()
-
-    conn.close()
-    return row[0] if row else None
+    return get_store().get(domain)
 
 
 # ---------------------------------
 # GET ALL LABEL ROWS
 # ---------------------------------
 def get_all_labels():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    return get_store().all()
+
+
+def get_labels_page(after=None, limit=DOMAIN_PAGE_SIZE, label=None, source=None, prefix=None):
+    return get_store().page(after, limit, label, source, prefix)
 
-    cursor.execute("SELECT domain, label, source FROM domain_labels")
-    rows = cursor.fetchall()
 
-    conn.close()
-    return rows
+def import_labels(rows, chunk=IMPORT_CHUNK):
+    return get_store().import_rows(rows, chunk)
+
+
+def iter_labels(label=None, source=None, chunk=EXPORT_CHUNK):
+    return get_store().iter_rows(label, source, chunk)
 
 
 # ---------------------------------
 # DELETE DOMAIN
 # ---------------------------------
 def delete_domain(domain: str):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    get_store().delete(domain)
+
+
+# ---------------------------------
+# AI ENTERTAINMENT VERDICT CACHE
+# ---------------------------------
+def get_ai_verdicts(domains):
+    return get_store().get_verdicts(domains)
 
-    cursor.execute("DELETE FROM domain_labels WHERE domain = ?", (domain.lower(),))
-    conn.commit()
-    conn.close()
+
+def save_ai_verdicts(verdicts: dict):
+    get_store().save_verdicts(verdicts)
+
+
+# ---------------------------------
+# SETTINGS KEPT IN THE DATABASE
+# ---------------------------------
+def get_or_create_meta(key: str, value: str):
+    return get_store().get_or_create_meta(key, value)
+
+
+# ---------------------------------
+# ACCOUNTS (pickled OAuth credentials per mailbox)
+# ---------------------------------
+def get_account_token(email: str):
+    return get_store().get_token(email)
+
+
+def save_account_token(email: str, token: bytes):
+    get_store().save_token(email, token)
+
+
+def list_accounts():
+    return get_store().list_accounts()
+
+
+# ---------------------------------
+# KEYWORD RULES (compiled by rules.py)
+# ---------------------------------
+def seed_rules(rules, version: int):
+    return get_store().seed_rules(rules, version)
+
+
+def get_rules():
+    return get_store().get_rules()
+
+
+def get_rules_version():
+    return get_store().get_rules_version()
+
+
+def add_rule_keyword(category: str, keyword: str):
+    get_store().add_rule_keyword(category, keyword)
+
+
+def delete_rule_keyword(category: str, keyword: str):
+    get_store().delete_rule_keyword(category, keyword)
+
+
+# ---------------------------------
+# GMAIL LABEL IDS (per account)
+# ---------------------------------
+def get_label_ids(account: str):
+    return get_store().get_label_ids(account)
+
+
+def save_label_ids(account: str, label_ids: dict, replace: bool = False):
+    get_store().save_label_ids(account, label_ids, replace)
+
+
+# ---------------------------------
+# FULL-MAILBOX BACKFILL CHECKPOINT
+# ---------------------------------
+def get_backfill(account: str):
+    return get_store().get_backfill(account)
+
+
+def save_backfill(account: str, page_token, processed: int, done: bool):
+    get_store().save_backfill(account, page_token, processed, done)
+
+
+# ---------------------------------
+# MAILBOX SYNC STATE (last historyId)
+# ---------------------------------
+def get_history_id(account: str, stream: str):
+    return get_store().get_history_id(account, stream)
+
+
+def save_history_id(account: str, stream: str, history_id):
+    get_store().save_history_id(account, stream, history_id)
+
+
+def record_sync_failures(account: str, stream: str, errors: dict):
+    return get_store().record_sync_failures(account, stream, errors)
+
+
+def get_parked_messages(account: str, stream: str, max_attempts: int):
+    return get_store().get_parked_messages(account, stream, max_attempts)
+
+
+def clear_sync_failures(account: str, stream: str, max_attempts: int):
+    get_store().clear_sync_failures(account, stream, max_attempts)
+
+
+# ---------------------------------
+# GENERATED REPLIES + CREATED DRAFTS
+# ---------------------------------
+def get_cached_reply(key: str):
+    return get_store().get_reply(key)
+
+
+def save_cached_reply(key: str, reply: str):
+    get_store().save_reply(key, reply)
+
+
+def get_message_draft(account: str, message_id: str):
+    """
+    Returns (draft_id, reply_key) if a draft was already created for this
+    message of the account, else None.
+    """
+    return get_store().get_message_draft(account, message_id)
+
+
+def claim_message_draft(account: str, message_id: str):
+    return get_store().claim_message_draft(account, message_id)
+
+
+def release_message_draft(account: str, message_id: str):
+    get_store().release_message_draft(account, message_id)
+
+
+def save_message_draft(account: str, message_id: str, draft_id: str, reply_key: str):
+    get_store().save_message_draft(account, message_id, draft_id, reply_key)
 
 
 # ---------------------------------
 # SEED STATIC DOMAINS (one time)
 # ---------------------------------
+# Bump SEED_VERSION whenever SEED_DOMAINS changes so existing databases
+# pick up the new rows on their next startup.
+SEED_VERSION = 1
+
+SEED_DOMAINS = {
+    # Entertainment
+    "netflix.com": "Entertainment",
+    "primevideo.com": "Entertainment",
+    "hotstar.com": "Entertainment",
+    "spotify.com": "Entertainment",
+    "instagram.com": "Entertainment",
+    "facebookmail.com": "Entertainment",
+    "redditmail.com": "Entertainment",
+    "pinterest.com": "Entertainment",
+
+    # Shopping
+    "amazon.in": "Shopping",
+    "flipkart.com": "Shopping",
+    "ajio.com": "Shopping",
+    "myntra.com": "Shopping",
+
+    # Food
+    "zomato.com": "Food",
+    "swiggy.com": "Food",
+
+    # Travel
+    "ola.com": "Travel",
+    "uber.com": "Travel",
+    "airindia.in": "Travel",
+    "goindigo.in": "Travel",
+
+    # Finance
+    "hdfcbank.com": "Finance",
+    "icicibank.com": "Finance",
+    "axisbank.com": "Finance",
+    "sbi.co.in": "Finance",
+    "paytm.com": "Finance",
+
+    # Career
+    "linkedin.com": "Career",
+    "naukri.com": "Career",
+    "indeed.com": "Career",
+
+    # Support
+    "support.google.com": "Support",
+    "support.microsoft.com": "Support",
+}
+
+
 def seed_initial_domains():
-    initial_domains = {
-        # Entertainment
-        "netflix.com": "Entertainment",
-        "primevideo.com": "Entertainment",
-        "hotstar.com": "Entertainment",
-        "spotify.com": "Entertainment",
-        "instagram.com": "Entertainment",
-        "facebookmail.com": "Entertainment",
-        "redditmail.com": "Entertainment",
-        "pinterest.com": "Entertainment",
-
-        # Shopping
-        "amazon.in": "Shopping",
-        "flipkart.com": "Shopping",
-        "ajio.com": "Shopping",
-        "myntra.com": "Shopping",
-
-        # Food
-        "zomato.com": "Food",
-        "swiggy.com": "Food",
-
-        # Travel
-        "ola.com": "Travel",
-        "uber.com": "Travel",
-        "airindia.in": "Travel",
-        "goindigo.in": "Travel",
-
-        # Finance
-        "hdfcbank.com": "Finance",
-        "icicibank.com": "Finance",
-        "axisbank.com": "Finance",
-        "sbi.co.in": "Finance",
-        "paytm.com": "Finance",
-
-        # Career
-        "linkedin.com": "Career",
-        "naukri.com": "Career",
-        "indeed.com": "Career",
-
-        # Support
-        "support.google.com": "Support",
-        "support.microsoft.com": "Support",
-    }
-
-    for domain, label in initial_domains.items():
-        save_domain_label(domain, label, source="seed")
+    get_store().seed(SEED_DOMAINS, SEED_VERSION)
@@ -0,0 +1,117 @@
+# domain_io.py
+
+import csv
+import io
+import json
+import os
+
+from db import SOURCE_RANK, import_labels
+from senders import is_valid_domain, normalize_domain
+
+# Imported domains are mostly seen once: bypass the memo so a large file
+# does not push the labeling loop's hot entries out of it
+clean_domain = normalize_domain.__wrapped__
+
+FORMATS = ("csv", "jsonl")
+FIELDS = ("domain", "label", "source")
+
+
+def guess_format(filename, default="csv"):
+    ext = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    if ext in ("jsonl", "ndjson"):
+        return "jsonl"
+    return "csv" if ext == "csv" else default
+
+
+# --------------------------
+# PARSING (CSV / JSONL → rows)
+# --------------------------
+def _jsonl_records(fp, stats):
+    for line in fp:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            stats["skipped"] += 1
+            continue
+        if isinstance(record, dict):
+            yield record
+        else:
+            stats["skipped"] += 1
+
+
+def read_rows(fp, fmt, source="manual", stats=None):
+    """
+    fp = text file. CSV needs a header with domain and label columns,
+    JSONL one object per line with the same keys; "source" is optional
+    and defaults to `source`.
+
+    Yields (domain, label, source) lazily, so a file of any size is
+    parsed as the import consumes it. Rows without a valid domain or a
+    label, or with an unknown source, are skipped and counted in
+    stats["skipped"].
+    """
+
+    if stats is None:
+        stats = {}
+    stats.setdefault("rows", 0)
+    stats.setdefault("skipped", 0)
+
+    if fmt == "csv":
+        records = csv.DictReader(fp)
+    elif fmt == "jsonl":
+        records = _jsonl_records(fp, stats)
+    else:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {FORMATS}")
+
+    for record in records:
+        domain = clean_domain(str(record.get("domain") or ""))
+        label = str(record.get("label") or "").strip()
+        src = str(record.get("source") or source).strip().lower()
+
+        if not is_valid_domain(domain) or not label or src not in SOURCE_RANK:
+            stats["skipped"] += 1
+            continue
+
+        stats["rows"] += 1
+        yield domain, label, src
+
+
+def import_file(fp, fmt, source="manual"):
+    """
+    fp = binary file. Imports it in one transaction and returns
+    {"rows": ..., "skipped": ..., "changed": ...}.
+    """
+
+    stats = {}
+    text = io.TextIOWrapper(fp, encoding="utf-8-sig", newline="")
+    try:
+        stats["changed"] = import_labels(read_rows(text, fmt, source, stats))
+    finally:
+        # leave closing fp to the caller
+        text.detach()
+    return stats
+
+
+# --------------------------
+# FORMATTING (rows → CSV / JSONL)
+# --------------------------
+def header(fmt):
+    return ",".join(FIELDS) + "\r\n" if fmt == "csv" else ""
+
+
+def format_rows(rows, fmt):
+    if fmt == "jsonl":
+        return "".join(json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + "\n" for row in rows)
+
+    out = io.StringIO()
+    csv.writer(out).writerows(rows)
+    return out.getvalue()
+
+
+def write_rows(pages, fmt):
+    """pages = iterable of row lists (db.iter_labels). Yields text chunks."""
+    yield header(fmt)
+    for rows in pages:
+        yield format_rows(rows, fmt)
@@ -0,0 +1,73 @@
+# domains_cli.py
+#
+# Bulk import / export of domain labels.
+#
+#   python domains_cli.py import vendors.csv [--source ai] [--format csv]
+#   python domains_cli.py export labels.jsonl [--label Shopping] [--source seed]
+#   python domains_cli.py export - --format csv        (stdout)
+#
+# A running server picks up imported rows within a few seconds.
+
+import argparse
+import sys
+import time
+
+from db import SOURCE_RANK, init_db, iter_labels
+from domain_io import FORMATS, guess_format, import_file, write_rows
+
+
+def run_import(args):
+    fmt = args.format or guess_format(args.file)
+    start = time.perf_counter()
+
+    if args.file == "-":
+        stats = import_file(sys.stdin.buffer, fmt, args.source)
+    else:
+        with open(args.file, "rb") as fp:
+            stats = import_file(fp, fmt, args.source)
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"{stats['rows']:,} rows read, {stats['changed']:,} written, "
+        f"{stats['skipped']:,} skipped in {elapsed:.2f}s",
+        file=sys.stderr
+    )
+
+
+def run_export(args):
+    fmt = args.format or guess_format(args.file)
+    chunks = write_rows(iter_labels(args.label, args.source_filter), fmt)
+
+    if args.file == "-":
+        sys.stdout.writelines(chunks)
+        return
+
+    with open(args.file, "w", encoding="utf-8", newline="") as fp:
+        fp.writelines(chunks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import/export of domain labels (CSV or JSONL).")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imp = sub.add_parser("import", help="upsert labels from a file ('-' for stdin)")
+    imp.add_argument("file")
+    imp.add_argument("--format", choices=FORMATS)
+    imp.add_argument("--source", choices=list(SOURCE_RANK), default="manual",
+                     help="source for rows that do not name one (default: manual)")
+    imp.set_defaults(run=run_import)
+
+    exp = sub.add_parser("export", help="write labels to a file ('-' for stdout)")
+    exp.add_argument("file")
+    exp.add_argument("--format", choices=FORMATS)
+    exp.add_argument("--label")
+    exp.add_argument("--source", dest="source_filter", choices=list(SOURCE_RANK))
+    exp.set_defaults(run=run_export)
+
+    args = parser.parse_args(argv)
+    init_db()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
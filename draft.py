@@ -1,20 +1,18 @@
+import asyncio
 import base64
+import hashlib
 import json
+import time
 from datetime import datetime, timedelta
 from email.mime.text import MIMEText
-from bs4 import BeautifulSoup
 import google.generativeai as genai
 
-
-# --------------------------
-# CLEAN HTML → PLAIN TEXT
-# --------------------------
-def clean_html(html):
-    try:
-        soup = BeautifulSoup(html, "html.parser")
-        return soup.get_text(separator="\n").strip()
-    except:
-        return html
+from aio import run_blocking
+from db import (
+    get_cached_reply, save_cached_reply, get_message_draft, save_message_draft,
+    claim_message_draft, release_message_draft,
+)
+from thread_context import build_thread_context
 
 
 # --------------------------
@@ -39,15 +37,43 @@ def is_recent(date_string):
         return False
 
 
+def is_recent_internal(internal_date_ms):
+    # internalDate = Gmail receive time in epoch ms, no header parsing needed
+    return time.time() - internal_date_ms / 1000 <= 86400
+
+
 # --------------------------
-# GENERATE AI REPLY
+# CANDIDATES FROM GMAIL SEARCH
 # --------------------------
-def generate_ai_reply(thread_text):
-    model = genai.GenerativeModel("models/gemini-2.5-flash")
+# Same rules as check_eligibility, evaluated by Gmail before anything is
+# downloaded. check_eligibility still runs on headers to be exact.
+ELIGIBLE_QUERY = "from:gmail.com newer_than:1d"
+
+
+def list_candidate_ids(service, user_id, query=ELIGIBLE_QUERY):
+    ids = set()
+    page_token = None
 
+    while True:
+        resp = service.users().messages().list(
+            userId=user_id, q=query, pageToken=page_token, maxResults=500
+        ).execute()
 
+        ids.update(m["id"] for m in resp.get("messages", []))
+        page_token = resp.get("nextPageToken")
+        if not page_token:
+            return ids
 
-    prompt = f"""
+
+# --------------------------
+# GENERATE AI REPLY
+# --------------------------
+# Bump PROMPT_VERSION whenever the prompt or model changes, so cached
+# replies made with the old one are not reused
+PROMPT_VERSION = 1
+REPLY_MODEL = "models/gemini-2.5-flash"
+
+REPLY_PROMPT = """
 You are an assistant that drafts professional and natural email replies.
 
 Below is the full email thread. Summaries and clean replies are allowed. 
@@ -59,14 +85,24 @@ THREAD:
 Write a helpful reply:
 """
 
-    response = model.generate_content(prompt)
+
+def reply_cache_key(thread_text):
+    return hashlib.sha256(f"{PROMPT_VERSION}\n{REPLY_MODEL}\n{thread_text}".encode()).hexdigest()
+
+
+async def generate_ai_reply(thread_text):
+    model = genai.GenerativeModel(REPLY_MODEL)
+
+    prompt = REPLY_PROMPT.format(thread_text=thread_text)
+
+    response = await model.generate_content_async(prompt)
     return response.text.strip()
 
 
 # --------------------------
 # CREATE GMAIL DRAFT
 # --------------------------
-def create_gmail_draft(service, user_id, to_email, subject, reply_text, thread_id):
+def create_gmail_draft(service, user_id, to_email, subject, reply_text, thread_id, http=None):
     message = MIMEText(reply_text, "plain")
     message["To"] = to_email
     message["Subject"] = "Re: " + subject
@@ -80,72 +116,122 @@ def create_gmail_draft(service, user_id, to_email, subject, reply_text, thread_i
         }
     }
 
-    draft = service.users().drafts().create(userId=user_id, body=draft_body).execute()
+    draft = service.users().drafts().create(userId=user_id, body=draft_body).execute(http=http)
     return draft
 
 
+def create_and_record_draft(service, user_id, account, message_id, reply_key, http=None, **draft):
+    """
+    Creates the draft and records it under (account, message_id) in one
+    blocking call, so the row is written even if the awaiting request was
+    cancelled meanwhile. A failed create gives the claim back.
+    """
+
+    try:
+        created = create_gmail_draft(service, user_id, http=http, **draft)
+    except Exception:
+        release_message_draft(account, message_id)
+        raise
+
+    save_message_draft(account, message_id, created["id"], reply_key)
+    return created
+
+
 # --------------------------
 # MAIN ENGINE USED BY main.py
 # --------------------------
-def generate_reply_and_save(service, message_full):
+def check_eligibility(record):
     """
-    message_full = Gmail message fetched with format="full"
+    Header-only rules, so they can run before the body is fetched.
+    Returns None when the message is eligible, else the skip result.
     """
 
-    headers = message_full["payload"]["headers"]
-
-    from_field = get_header(headers, "From")
-    subject = get_header(headers, "Subject")
-    date_str = get_header(headers, "Date")
-    thread_id = message_full.get("threadId")
-
     # -------------------------------
     # RULE 1: Sender must be @gmail.com
     # -------------------------------
-    if "@gmail.com" not in from_field:
-        return {"eligible": False, "reason": "Sender not gmail.com"}
+    if "@gmail.com" not in record.sender_raw:
+        return {"eligible": False, "message_id": record.id, "reason": "Sender not gmail.com"}
 
     # -------------------------------
     # RULE 2: Only reply if < 24 hours old
     # -------------------------------
-    if not is_recent(date_str):
-        return {"eligible": False, "reason": "Email older than 24 hours"}
+    recent = is_recent_internal(record.internal_date) if record.internal_date else is_recent(record.date)
+    if not recent:
+        return {"eligible": False, "message_id": record.id, "reason": "Email older than 24 hours"}
+
+    return None
 
-    # -------------------------------
-    # Extract the HTML body
-    # -------------------------------
-    def extract_body(payload):
-        if "body" in payload and "data" in payload["body"]:
-            return base64.urlsafe_b64decode(payload["body"]["data"]).decode("utf-8")
-        if "parts" in payload:
-            for p in payload["parts"]:
-                result = extract_body(p)
-                if result:
-                    return result
-        return ""
-
-    html_body = extract_body(message_full["payload"])
-    plain_text = clean_html(html_body)
+
+async def generate_reply_and_save(service, record, http=None, model_timeout=None):
+    """
+    record = pipeline.MessageRecord (metadata is enough, the thread is
+    fetched here)
+    http = optional per-call transport, needed when several drafts are
+    created concurrently with the same service object
+    model_timeout = seconds allowed for the model call (asyncio.TimeoutError
+    after that). Draft creation is never cut short: a cancelled create
+    would still run in its thread and leave an unrecorded draft.
+    """
+
+    skip = check_eligibility(record)
+    if skip:
+        return skip
 
     # -------------------------------
-    # Generate AI reply
+    # Claim the message first: concurrent runs for the same mailbox
+    # must not both draft it. Already drafted → return that draft.
     # -------------------------------
-    reply_text = generate_ai_reply(plain_text)
+    if not await run_blocking(claim_message_draft, record.account, record.id):
+        existing = await run_blocking(get_message_draft, record.account, record.id)
+        if existing and existing[0]:
+            draft_id, reply_key = existing
+            reply_text = await run_blocking(get_cached_reply, reply_key) or ""
+            return {
+                "eligible": True,
+                "message_id": record.id,
+                "draft_id": draft_id,
+                "reply_preview": reply_text[:200] + "...",
+                "cached": True
+            }
+        return {"eligible": False, "message_id": record.id, "reason": "Draft already in progress"}
+
+    try:
+        # -------------------------------
+        # Generate AI reply from the (budgeted) thread,
+        # reusing an earlier reply for the same thread text
+        # -------------------------------
+        context = await run_blocking(build_thread_context, service, "me", record, http=http)
+        reply_key = reply_cache_key(context)
+
+        reply_text = await run_blocking(get_cached_reply, reply_key)
+        if reply_text is None:
+            reply_text = await asyncio.wait_for(generate_ai_reply(context), model_timeout)
+            await run_blocking(save_cached_reply, reply_key, reply_text)
+    except BaseException:
+        # includes cancellation; nothing was created, let a later run retry
+        await asyncio.shield(run_blocking(release_message_draft, record.account, record.id))
+        raise
 
     # -------------------------------
-    # Create Gmail draft
+    # Create Gmail draft (and record it, even if we are cancelled now)
     # -------------------------------
-    draft = create_gmail_draft(
+    draft = await run_blocking(
+        create_and_record_draft,
         service=service,
         user_id="me",
-        to_email=from_field,
-        subject=subject,
+        account=record.account,
+        message_id=record.id,
+        reply_key=reply_key,
+        to_email=record.sender_raw,
+        subject=record.subject,
         reply_text=reply_text,
-        thread_id=thread_id
+        thread_id=record.thread_id,
+        http=http
     )
 
     return {
         "eligible": True,
+        "message_id": record.id,
         "draft_id": draft["id"],
         "reply_preview": reply_text[:200] + "..."
     }
@@ -0,0 +1,164 @@
+# gmail_batch.py
+
+import google_auth_httplib2
+import httplib2
+
+# Gmail accepts up to 100 calls per batch, but recommends staying at or
+# below 50 to avoid rate limiting of the individual calls.
+BATCH_SIZE = 50
+
+
+# --------------------------
+# HEADER LIST → DICT
+# --------------------------
+def parse_headers(message, names):
+    """
+    message = Gmail message fetched with format="metadata" (or "full")
+    Returns {"subject": ..., "from": ...} for the requested header names,
+    with "" for any header the message does not carry.
+    """
+
+    wanted = {n.lower(): n.lower() for n in names}
+    parsed = {key: "" for key in wanted.values()}
+
+    for h in message.get("payload", {}).get("headers", []):
+        key = wanted.get(h["name"].lower())
+        if key and not parsed[key]:
+            parsed[key] = h["value"]
+
+    return parsed
+
+
+# --------------------------
+# BATCHED MESSAGE FETCH
+# --------------------------
+def fetch_messages(service, user_id, message_ids, format="metadata", headers=("Subject", "From"), batch_size=BATCH_SIZE):
+    """
+    Fetches many messages, one Gmail batch request per `batch_size` ids
+    instead of one HTTP round trip per message.
+
+    Returns:
+        messages, errors
+        messages = {message_id: raw Gmail message}
+        errors = {message_id: exception} for items that failed in the batch
+    """
+
+    messages, errors = {}, {}
+
+    def on_response(request_id, response, exception):
+        if exception is not None:
+            errors[request_id] = exception
+        else:
+            messages[request_id] = response
+
+    for i in range(0, len(message_ids), batch_size):
+        chunk = message_ids[i:i+batch_size]
+
+        batch = service.new_batch_http_request(callback=on_response)
+        for mid in chunk:
+            params = {"userId": user_id, "id": mid, "format": format}
+            if format == "metadata":
+                params["metadataHeaders"] = list(headers)
+            batch.add(service.users().messages().get(**params), request_id=mid)
+
+        try:
+            batch.execute()
+        except Exception as e:
+            # Whole batch failed (network, auth) → mark every item in it
+            for mid in chunk:
+                if mid not in messages:
+                    errors.setdefault(mid, e)
+
+    return messages, errors
+
+
+# --------------------------
+# BULK LABEL WRITES
+# --------------------------
+# messages.batchModify accepts at most 1000 ids per call
+MODIFY_BATCH_SIZE = 1000
+
+
+def batch_add_labels(service, user_id, grouped, batch_size=MODIFY_BATCH_SIZE):
+    """
+    grouped = {label_id: [message_id, ...]}
+
+    Issues one messages.batchModify call per label (per `batch_size` ids)
+    instead of one messages.modify per message.
+
+    Returns:
+        {message_id: exception} for every id whose call failed
+    """
+
+    failed = {}
+
+    for label_id, ids in grouped.items():
+        for i in range(0, len(ids), batch_size):
+            chunk = ids[i:i+batch_size]
+            try:
+                service.users().messages().batchModify(
+                    userId=user_id,
+                    body={"ids": chunk, "addLabelIds": [label_id]}
+                ).execute()
+            except Exception as e:
+                for mid in chunk:
+                    failed[mid] = e
+
+    return failed
+
+
+# --------------------------
+# BULK LABEL CREATION
+# --------------------------
+def create_labels(service, user_id, names, batch_size=BATCH_SIZE):
+    """
+    Creates every label in `names` with one batch request (per
+    `batch_size` names) instead of one labels.create round trip each.
+
+    Returns:
+        created, errors
+        created = {name: label_id}
+        errors = {name: exception}
+    """
+
+    created, errors = {}, {}
+
+    for i in range(0, len(names), batch_size):
+        chunk = names[i:i+batch_size]
+
+        def on_response(request_id, response, exception, chunk=chunk):
+            # label names may contain "/" → request ids are positions
+            name = chunk[int(request_id)]
+            if exception is not None:
+                errors[name] = exception
+            else:
+                created[name] = response["id"]
+
+        batch = service.new_batch_http_request(callback=on_response)
+        for pos, name in enumerate(chunk):
+            batch.add(
+                service.users().labels().create(userId=user_id, body={"name": name}),
+                request_id=str(pos)
+            )
+
+        try:
+            batch.execute()
+        except Exception as e:
+            for name in chunk:
+                if name not in created:
+                    errors.setdefault(name, e)
+
+    return created, errors
+
+
+# --------------------------
+# PER-CALL TRANSPORT
+# --------------------------
+def new_http(creds):
+    """
+    httplib2 connections are not thread-safe. Pass one of these as
+    request.execute(http=...) when calls on a shared service object run
+    concurrently.
+    """
+
+    return google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
@@ -0,0 +1,187 @@
+# jobs.py
+
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = 4
+PER_ACCOUNT_LIMIT = 1
+KEEP_FINISHED = 1000
+
+# Full-mailbox backfills run for hours, so they get their own lane (pool
+# and per-account slot): they never hold up an account's sync jobs, and
+# never take every worker from other accounts
+BACKFILL_WORKERS = 2
+
+
+# --------------------------
+# JOB (status + progress events)
+# --------------------------
+class Job:
+    def __init__(self, account, name):
+        self.id = uuid.uuid4().hex
+        self.account = account
+        self.name = name
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.events = [{"job": self.id, "status": "queued"}]
+        self.lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def progress(self, stage, **data):
+        with self.lock:
+            self.events.append({"job": self.id, "status": self.status, "stage": stage, **data})
+
+    def _set_status(self, status, **data):
+        with self.lock:
+            self.status = status
+            self.events.append({"job": self.id, "status": status, **data})
+
+    def snapshot(self):
+        return {
+            "id": self.id,
+            "account": self.account,
+            "name": self.name,
+            "status": self.status,
+            "events": len(self.events),
+            "result": self.result,
+            "error": self.error,
+        }
+
+    async def stream(self, poll=0.25, keepalive=15):
+        """
+        Yields progress events as NDJSON lines until the job finishes.
+        Polls the event list rather than parking a thread per open stream;
+        a blank line goes out every `keepalive` seconds without news so
+        proxies keep the connection open.
+        """
+
+        sent, idle = 0, 0.0
+        while True:
+            new = self.events[sent:]
+            done = self.finished
+
+            if new:
+                for event in new:
+                    yield json.dumps(event, default=str) + "\n"
+                sent += len(new)
+                idle = 0.0
+            elif idle >= keepalive:
+                yield "\n"
+                idle = 0.0
+
+            if done and sent == len(self.events):
+                return
+
+            await asyncio.sleep(poll)
+            idle += poll
+
+
+# --------------------------
+# IN-PROCESS JOB QUEUE
+# --------------------------
+class JobQueue:
+    """
+    Runs jobs on a bounded thread pool. At most `per_account` jobs run at
+    once for the same account; the rest wait in that account's queue and
+    are started as earlier ones finish.
+    """
+
+    def __init__(self, workers=MAX_WORKERS, per_account=PER_ACCOUNT_LIMIT, keep=KEEP_FINISHED):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.per_account = per_account
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.jobs = OrderedDict()
+        self.running = {}
+        self.waiting = {}
+
+    def submit(self, account, name, fn, *args, **kwargs):
+        """
+        fn(job, *args, **kwargs) runs in the background; its return value
+        becomes job.result. Returns the Job immediately.
+        """
+
+        job = Job(account, name)
+
+        with self.lock:
+            self.jobs[job.id] = job
+            self._trim()
+
+            if self.running.get(account, 0) < self.per_account:
+                self.running[account] = self.running.get(account, 0) + 1
+                start = True
+            else:
+                self.waiting.setdefault(account, deque()).append((job, fn, args, kwargs))
+                start = False
+
+        if start:
+            self.pool.submit(self._run, job, fn, args, kwargs)
+
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def active(self, account, name):
+        """True if a `name` job for `account` is queued or running."""
+        with self.lock:
+            return any(
+                job.account == account and job.name == name and not job.finished
+                for job in self.jobs.values()
+            )
+
+    def _run(self, job, fn, args, kwargs):
+        job._set_status("running")
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job._set_status("done", result=job.result)
+        except Exception as e:
+            job.error = str(e)
+            job._set_status("failed", error=job.error)
+        finally:
+            self._next(job.account)
+
+    def _next(self, account):
+        with self.lock:
+            queue = self.waiting.get(account)
+            if queue:
+                nxt = queue.popleft()
+                if not queue:
+                    del self.waiting[account]
+            else:
+                nxt = None
+                self.running[account] -= 1
+                if not self.running[account]:
+                    del self.running[account]
+
+        if nxt is not None:
+            self.pool.submit(self._run, *nxt)
+
+    def _trim(self):
+        # drop the oldest finished jobs beyond `keep`
+        excess = len(self.jobs) - self.keep
+        for job_id in list(self.jobs):
+            if excess <= 0:
+                break
+            if self.jobs[job_id].finished:
+                del self.jobs[job_id]
+                excess -= 1
+
+
+queue = JobQueue()
+backfill_queue = JobQueue(workers=BACKFILL_WORKERS)
+
+
+def get(job_id):
+    return queue.get(job_id) or backfill_queue.get(job_id)
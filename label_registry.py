@@ -0,0 +1,121 @@
+# label_registry.py
+
+import threading
+
+from googleapiclient.errors import HttpError
+
+from db import get_label_ids, save_label_ids
+from gmail_batch import batch_add_labels, create_labels
+
+
+def is_stale_label(exc):
+    # a stored label id that was deleted in Gmail: 404, or 400 "Invalid label"
+    if not isinstance(exc, HttpError):
+        return False
+    return exc.resp.status == 404 or (exc.resp.status == 400 and "label" in str(exc).lower())
+
+
+# --------------------------
+# LABEL NAME → ID, PER ACCOUNT
+# --------------------------
+class LabelRegistry:
+    """
+    Remembers Gmail label ids per account (in memory, backed by the
+    gmail_labels table), so labeling does not list every label first.
+
+    The stored ids are trusted until Gmail rejects one: then the account
+    is re-listed once and the affected messages are retried. Labels that
+    are missing are all created in one batch before any message is
+    modified.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.maps = {}
+        self.account_locks = {}
+
+    def _account_lock(self, account):
+        with self.lock:
+            return self.account_locks.setdefault(account, threading.Lock())
+
+    def _map(self, account):
+        with self.lock:
+            label_map = self.maps.get(account)
+            if label_map is None:
+                label_map = self.maps[account] = get_label_ids(account)
+            return label_map
+
+    def refresh(self, service, user_id, account):
+        labels = service.users().labels().list(userId=user_id).execute().get("labels", [])
+        label_map = {lbl["name"].lower(): lbl["id"] for lbl in labels}
+
+        save_label_ids(account, label_map, replace=True)
+        with self.lock:
+            self.maps[account] = label_map
+        return label_map
+
+    def ensure(self, service, user_id, account, names):
+        """
+        Returns {name: label_id} for `names`, creating the missing ones in
+        one batch. Names that could not be created are left out.
+        """
+
+        with self._account_lock(account):
+            label_map = self._map(account)
+            missing = [n for n in dict.fromkeys(names) if n.lower() not in label_map]
+
+            if missing:
+                created, errors = create_labels(service, user_id, missing)
+                if errors:
+                    # usually 409: made in Gmail since we last listed → resync
+                    label_map = self.refresh(service, user_id, account)
+                else:
+                    created = {n.lower(): label_id for n, label_id in created.items()}
+                    save_label_ids(account, created)
+                    label_map = {**label_map, **created}
+                    with self.lock:
+                        self.maps[account] = label_map
+
+        return {n: label_map[n.lower()] for n in names if n.lower() in label_map}
+
+    def add_labels(self, service, user_id, account, pending):
+        """
+        pending = {label name: [message_id, ...]}
+
+        Adds each label to its messages with batchModify. Returns
+        {message_id: exception} for messages left unlabeled.
+        """
+
+        failed = {}
+        failed.update(self._add(service, user_id, account, pending))
+
+        stale = {mid for mid, exc in failed.items() if is_stale_label(exc)}
+        if stale:
+            self.refresh(service, user_id, account)
+            retry = {}
+            for name, mids in pending.items():
+                mids = [mid for mid in mids if mid in stale]
+                if mids:
+                    retry[name] = mids
+            for mid in stale:
+                del failed[mid]
+            failed.update(self._add(service, user_id, account, retry))
+
+        return failed
+
+    def _add(self, service, user_id, account, pending):
+        label_ids = self.ensure(service, user_id, account, list(pending))
+
+        grouped, failed = {}, {}
+        for name, mids in pending.items():
+            if name in label_ids:
+                grouped[label_ids[name]] = mids
+            else:
+                for mid in mids:
+                    failed[mid] = RuntimeError(f"Label {name!r} could not be created")
+
+        failed.update(batch_add_labels(service, user_id, grouped))
+        return failed
+
+
+labels = LabelRegistry()
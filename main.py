@@ -1,29 +1,47 @@
 import os
-import re
+import asyncio
 import json
-import pickle
+import tempfile
+from html import escape
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, JSONResponse
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request as GoogleRequest
 from dotenv import load_dotenv
 import google.generativeai as genai
 
+# .env first: local modules read settings from the environment
+load_dotenv()
+
 # Local imports
-from draft import generate_reply_and_save
-from db import init_db, save_domain_label, get_domain_label, get_all_labels, delete_domain
+from draft import generate_reply_and_save, check_eligibility, list_candidate_ids
+from gmail_batch import new_http
+from label_registry import labels
+from pipeline import load_records
+from ratelimit import TokenBucket, with_retries
+from rules import UNKNOWN_RESULT, init_rules, repository as rules, rule_based_classify
+from sync import finish_sync, list_new_messages
+from backfill import is_gone, run_backfill
+from domain_io import FORMATS, format_rows, header, import_file
+from jobs import backfill_queue, get as get_job, queue as jobs
+from aio import run_blocking
+from auth import SESSION_MAX_AGE, credentials, read_session, sign_session
+from scheduler import Scheduler
+from db import (
+    init_db, save_domain_label, get_domain_label, get_labels_page, delete_domain,
+    get_ai_verdicts, save_ai_verdicts, add_rule_keyword, delete_rule_keyword,
+    iter_labels, DOMAIN_PAGE_SIZE, SOURCE_RANK,
+)
 
 # -----------------------------
 # ENV + GEMINI CONFIG
 # -----------------------------
-load_dotenv()
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
 
 CLIENT_SECRETS_FILE = "client_secret_testing.json"
-TOKEN_FILE = "token.pkl"
 
 SCOPES = [
     "https://www.googleapis.com/auth/gmail.modify",
@@ -37,89 +55,54 @@ SCOPES = [
 # APP + DB INIT
 # -----------------------------
 app = FastAPI()
-init_db()
 
-
-# -----------------------------
-# TOKEN HANDLING
-# -----------------------------
-def save_credentials(creds):
-    with open(TOKEN_FILE, "wb") as f:
-        pickle.dump(creds, f)
+# Signed session cookie set after login (see auth.sign_session)
+SESSION_COOKIE = "session"
 
 
-def load_credentials():
-    if not os.path.exists(TOKEN_FILE):
-        return None
+@app.on_event("startup")
+async def startup():
+    await run_blocking(init_db)
+    await run_blocking(init_rules)
+    credentials.start()
 
-    with open(TOKEN_FILE, "rb") as f:
-        creds = pickle.load(f)
+    # job threads hand async drafting back to the app's event loop
+    app.state.loop = asyncio.get_running_loop()
+    scheduler.start()
 
-    if creds and creds.expired and creds.refresh_token:
-        creds.refresh(GoogleRequest())
-        save_credentials(creds)
 
-    return creds
-
-
-# -----------------------------
-# HELPERS
-# -----------------------------
-def extract_domain(email):
-    if "@" in email:
-        return email.split("@")[1].lower()
-    return ""
-
-
-def contains(text, keywords):
-    text = text.lower()
-    return any(k in text for k in keywords)
+def current_account(request):
+    return read_session(request.cookies.get(SESSION_COOKIE))
 
 
 # -----------------------------
 # RULE-BASED CLASSIFICATION
 # -----------------------------
-FIN_WORDS = ["invoice", "payment", "loan", "bank", "emi"]
-BILL_WORDS = ["bill", "billing", "electricity"]
-PROMO_WORDS = ["sale", "discount", "offer"]
-TRAVEL_WORDS = ["flight", "booking", "itinerary"]
-CAREER_WORDS = ["job", "hiring", "interview"]
-WORK_WORDS = ["meeting", "update", "deadline"]
-
-def rule_based(subject, sender):
-    subject_l = subject.lower()
-    sender_l = sender.lower()
-
-    if contains(subject_l, FIN_WORDS):
-        return "Finance", 90, "Rule-based: Finance"
-    if contains(subject_l, BILL_WORDS):
-        return "Bills", 90, "Rule-based: Bills"
-    if contains(subject_l, PROMO_WORDS):
-        return "Promotions", 85, "Rule-based: Promotions"
-    if contains(subject_l, CAREER_WORDS):
-        return "Career", 80, "Rule-based: Career"
-    if contains(subject_l, WORK_WORDS):
-        return "Work", 75, "Rule-based: Work"
-    if contains(subject_l, TRAVEL_WORDS):
-        return "Travel", 85, "Rule-based: Travel"
+# Keyword rules live in the rules table (see rules.py); categories here
+# are detected but never labeled in Gmail
+SKIP_CATEGORIES = ("Personal", "Newsletter")
 
-    if sender_l.endswith("@gmail.com"):
-        return "Personal", 50, "Personal Gmail"
 
-    return None, None, None
+def rule_based(subject, sender):
+    category, conf, reason = rule_based_classify(subject, sender)
+    if category == UNKNOWN_RESULT[0]:
+        return None, None, None
+    return category, conf, reason
 
 
 # -----------------------------
 # AI ENTERTAINMENT FALLBACK
 # -----------------------------
-def ai_classify_domains(domains):
-    model = genai.GenerativeModel("models/gemini-2.5-flash")
-    result_map = {}
+AI_BATCH_SIZE = 20
+AI_MAX_WORKERS = 4
+AI_MAX_RETRIES = 3
+
+# Shared across requests so concurrent logins stay under the Gemini quota
+ai_bucket = TokenBucket(rate=2, capacity=4)
 
-    for i in range(0, len(domains), 20):
-        batch = domains[i:i+20]
 
-        prompt = f"""
+def ai_classify_batch(model, batch):
+    prompt = f"""
 Classify each domain as entertainment/social/dating or not.
 
 Return ONLY JSON:
@@ -131,59 +114,91 @@ Return ONLY JSON:
 
 Domains: {batch}
 """
-        try:
-            out = model.generate_content(prompt)
-            cleaned = out.text.replace("```json", "").replace("```", "").strip()
-            parsed = json.loads(cleaned)
+    out = model.generate_content(prompt)
+    cleaned = out.text.replace("```json", "").replace("```", "").strip()
+    parsed = json.loads(cleaned)
 
-            for row in parsed["results"]:
-                result_map[row["domain"]] = row["entertainment"]
+    wanted = set(batch)
+    verdicts = {}
+    for row in parsed["results"]:
+        domain = str(row["domain"]).lower()
+        if domain in wanted:
+            verdicts[domain] = bool(row["entertainment"])
 
-        except:
-            for d in batch:
-                result_map[d] = False
+    return verdicts
 
-    return result_map
 
+def ai_classify_domains(domains, model=None):
+    """
+    Returns {domain: bool}. Batches are sent concurrently through a
+    bounded pool, rate limited and retried with backoff. Domains from a
+    batch that still fails are left out of the result (and not stored),
+    rather than being marked as non-entertainment.
+    """
 
-# -----------------------------
-# APPLY LABELS TO EMAILS
-# -----------------------------
-def apply_labels(service, user_id, messages, entertainment_cache):
-    label_map = {
-        lbl["name"].lower(): lbl["id"]
-        for lbl in service.users().labels().list(userId=user_id).execute().get("labels", [])
-    }
+    domains = [d for d in domains if d]
 
-    def ensure_label(name):
-        name_l = name.lower()
-        if name_l in label_map:
-            return label_map[name_l]
+    # Only domains without a fresh stored verdict reach the model
+    result_map = get_ai_verdicts(domains)
+    domains = [d for d in domains if d.lower() not in result_map]
+    if not domains:
+        return result_map
 
-        new = service.users().labels().create(
-            userId=user_id,
-            body={"name": name}
-        ).execute()
+    if model is None:
+        model = genai.GenerativeModel("models/gemini-2.5-flash")
 
-        label_map[name_l] = new["id"]
-        return new["id"]
+    batches = [domains[i:i+AI_BATCH_SIZE] for i in range(0, len(domains), AI_BATCH_SIZE)]
+    fresh = {}
 
-    results = {}
+    with ThreadPoolExecutor(max_workers=AI_MAX_WORKERS) as pool:
+        futures = {
+            pool.submit(
+                with_retries, lambda b=batch: ai_classify_batch(model, b),
+                retries=AI_MAX_RETRIES, bucket=ai_bucket
+            ): batch
+            for batch in batches
+        }
 
-    for msg in messages:
-        meta = service.users().messages().get(
-            userId=user_id, id=msg["id"], format="metadata",
-            metadataHeaders=["Subject", "From"]
-        ).execute()
+        for fut in as_completed(futures):
+            try:
+                fresh.update(fut.result())
+            except Exception as e:
+                print(f"AI batch failed after retries ({len(futures[fut])} domains): {e}")
 
-        headers = meta["payload"]["headers"]
-        subject = next((h["value"] for h in headers if h["name"]=="Subject"), "")
-        sender_raw = next((h["value"] for h in headers if h["name"]=="From"), "")
+    save_ai_verdicts(fresh)
+    result_map.update(fresh)
 
-        match = re.search(r"<([^>]+)>", sender_raw)
-        sender = match.group(1) if match else sender_raw
+    return result_map
 
-        domain = extract_domain(sender)
+
+# -----------------------------
+# APPLY LABELS TO EMAILS
+# -----------------------------
+def error_status(exc):
+    # HTTP status of a Gmail HttpError (404 → message deleted meanwhile)
+    return getattr(getattr(exc, "resp", None), "status", None)
+
+
+def apply_labels(service, user_id, account, messages, entertainment_cache):
+    results = {}
+    pending = {}
+
+    ids = [msg["id"] for msg in messages]
+    loaded, errors = load_records(service, user_id, account, ids)
+
+    for mid in ids:
+        if mid not in loaded:
+            exc = errors.get(mid)
+            results[mid] = {
+                "category": "None", "confidence": 0, "reason": f"Fetch failed: {exc}",
+                "error": str(exc), "status": error_status(exc),
+            }
+            continue
+
+        record = loaded[mid]
+        subject = record.subject
+        sender = record.sender
+        domain = record.domain
 
         # 1) DB OVERRIDE
         db_label = get_domain_label(domain)
@@ -202,20 +217,22 @@ def apply_labels(service, user_id, messages, entertainment_cache):
                     conf = 80
                     reason = "AI entertainment"
                 else:
-                    results[msg["id"]] = {"category": "None", "confidence": 0, "reason": "No rule matched"}
+                    results[mid] = {"category": "None", "confidence": 0, "reason": "No rule matched"}
                     continue
 
-        if category in ["Personal"]:
-            results[msg["id"]] = {"category": "Personal (skipped)", "confidence": conf, "reason": reason}
+        if category in SKIP_CATEGORIES:
+            results[mid] = {"category": f"{category} (skipped)", "confidence": conf, "reason": reason}
             continue
 
-        lbl_id = ensure_label(category)
+        pending.setdefault(category, []).append(mid)
+        results[mid] = {"category": category, "confidence": conf, "reason": reason}
 
-        service.users().messages().modify(
-            userId=user_id, id=msg["id"], body={"addLabelIds": [lbl_id]}
-        ).execute()
+    # Missing labels are created up front, then one batchModify per category
+    failed = labels.add_labels(service, user_id, account, pending)
 
-        results[msg["id"]] = {"category": category, "confidence": conf, "reason": reason}
+    for mid, exc in failed.items():
+        results[mid]["reason"] += f" (label not applied: {exc})"
+        results[mid]["error"] = str(exc)
 
     return results
 
@@ -224,40 +241,67 @@ def apply_labels(service, user_id, messages, entertainment_cache):
 # ROUTES
 # -----------------------------
 @app.get("/")
-def index():
+async def index():
     return HTMLResponse("""
         <h2>Welcome to Light MVP 🚀</h2>
         <p><a href='/login'>Login with Google</a></p>
         <p><a href='/domains'>Manage Domains</a></p>
+        <p><a href='/rules'>Manage Rules</a></p>
     """)
 
 
 # -----------------------------
 # DOMAIN MANAGEMENT UI
 # -----------------------------
-@app.get("/domains")
-def domains():
-    rows = get_all_labels()
+# Rows fetched per round trip while streaming the page; the API caps limit
+DOMAINS_STREAM_CHUNK = 500
+API_MAX_LIMIT = 1000
+
 
-    html = """
+async def iter_domain_pages(label=None, prefix=None, chunk=DOMAINS_STREAM_CHUNK):
+    # keyset pages, so the DB lock is never held while the client reads
+    after = None
+    while True:
+        rows = await run_blocking(get_labels_page, after, chunk, label, None, prefix)
+        if rows:
+            yield rows
+        if len(rows) < chunk:
+            return
+        after = rows[-1][0]
+
+
+@app.get("/domains")
+async def domains(label: str = None, q: str = None):
+    async def render():
+        yield f"""
     <h2>📁 Domain Label Management</h2>
     <a href='/'>← Back</a><br><br>
 
+    <form action='/domains' method='GET'>
+        Domain starts with: <input name='q' value='{escape(q or "", quote=True)}'>
+        Label: <input name='label' value='{escape(label or "", quote=True)}'>
+        <button type='submit'>Filter</button>
+    </form><br>
+
     <table border='1' cellpadding='6'>
         <tr><th>Domain</th><th>Label</th><th>Source</th><th>Action</th></tr>
     """
 
-    for domain, label, source in rows:
-        html += f"""
+        # one chunk of the response per page of rows
+        async for rows in iter_domain_pages(label, q):
+            yield "".join(
+                f"""
         <tr>
-            <td>{domain}</td>
-            <td>{label}</td>
-            <td>{source}</td>
-            <td><a href='/delete_domain?domain={domain}'>Delete</a></td>
+            <td>{escape(domain)}</td>
+            <td>{escape(lbl or "")}</td>
+            <td>{escape(source or "")}</td>
+            <td><a href='/delete_domain?domain={quote(domain)}'>Delete</a></td>
         </tr>
         """
+                for domain, lbl, source in rows
+            )
 
-    html += """
+        yield """
     </table>
     <br><br>
 
@@ -269,27 +313,159 @@ def domains():
     </form>
     """
 
-    return HTMLResponse(html)
+    return StreamingResponse(render(), media_type="text/html; charset=utf-8")
+
+
+@app.get("/api/domains")
+async def api_domains(after: str = None, limit: int = DOMAIN_PAGE_SIZE, label: str = None,
+                      source: str = None, q: str = None):
+    """
+    Keyset-paginated listing in domain order. Pass the returned `next`
+    as `after` to get the following page; `next` is null on the last one.
+    """
+
+    limit = max(1, min(limit, API_MAX_LIMIT))
+    rows = await run_blocking(get_labels_page, after, limit, label, source, q)
+
+    return {
+        "items": [{"domain": d, "label": lbl, "source": src} for d, lbl, src in rows],
+        "next": rows[-1][0] if len(rows) == limit else None,
+    }
+
+
+# -----------------------------
+# BULK IMPORT / EXPORT (CSV, JSONL)
+# -----------------------------
+EXPORT_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson"}
+
+
+@app.post("/api/domains/import")
+async def import_domains(request: Request, format: str = "csv", source: str = "manual"):
+    """
+    Request body = the CSV or JSONL file. It is spooled to a temp file as
+    it arrives, then upserted in one transaction (manual > seed > ai).
+    """
+
+    if format not in FORMATS or source not in SOURCE_RANK:
+        return JSONResponse({"error": "format must be csv/jsonl, source manual/seed/ai"}, status_code=400)
+
+    with tempfile.TemporaryFile() as fp:
+        async for chunk in request.stream():
+            fp.write(chunk)
+        fp.seek(0)
+        return await run_blocking(import_file, fp, format, source)
+
+
+@app.get("/api/domains/export")
+async def export_domains(format: str = "csv", label: str = None, source: str = None):
+    if format not in FORMATS:
+        return JSONResponse({"error": "format must be csv or jsonl"}, status_code=400)
+
+    pages = iter_labels(label, source)
+
+    async def body():
+        try:
+            yield header(format)
+            while True:
+                rows = await run_blocking(next, pages, None)
+                if rows is None:
+                    return
+                yield format_rows(rows, format)
+        finally:
+            # client went away early → release the read connection
+            pages.close()
+
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename=domains.{format}"}
+    )
 
 
 @app.get("/save_domain")
-def save_domain(domain: str, label: str):
-    save_domain_label(domain, label, source="manual")
+async def save_domain(domain: str, label: str):
+    try:
+        await run_blocking(save_domain_label, domain, label, source="manual")
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
     return RedirectResponse("/domains", status_code=302)
 
 
 @app.get("/delete_domain")
-def delete_domain_route(domain: str):
-    delete_domain(domain)
+async def delete_domain_route(domain: str):
+    await run_blocking(delete_domain, domain)
     return RedirectResponse("/domains", status_code=302)
 
 
+# -----------------------------
+# KEYWORD RULE MANAGEMENT UI
+# -----------------------------
+@app.get("/rules")
+async def rules_page():
+    ruleset = await run_blocking(rules.current)
+
+    html = f"""
+    <h2>🔎 Keyword Rules (version {ruleset.version})</h2>
+    <a href='/'>← Back</a><br><br>
+
+    <table border='1' cellpadding='6'>
+        <tr><th>Category</th><th>Confidence</th><th>Scopes</th><th>Keywords</th></tr>
+    """
+
+    for category, conf, _, words, scopes in ruleset.rules:
+        links = ", ".join(
+            f"{escape(w)} <a href='/delete_rule_keyword?category={quote(category)}&keyword={quote(w)}'>✕</a>"
+            for w in words
+        )
+        html += f"""
+        <tr>
+            <td>{escape(category)}</td>
+            <td>{conf}</td>
+            <td>{escape(", ".join(scopes))}</td>
+            <td>{links}</td>
+        </tr>
+        """
+
+    html += """
+    </table>
+    <br><br>
+
+    <h3>Add Keyword</h3>
+    <form action='/add_rule_keyword' method='GET'>
+        Category: <input name='category' required>
+        Keyword: <input name='keyword' required>
+        <button type='submit'>Add</button>
+    </form>
+    """
+
+    return HTMLResponse(html)
+
+
+@app.get("/add_rule_keyword")
+async def add_rule_keyword_route(category: str, keyword: str):
+    try:
+        await run_blocking(add_rule_keyword, category, keyword)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    rules.invalidate()
+    return RedirectResponse("/rules", status_code=302)
+
+
+@app.get("/delete_rule_keyword")
+async def delete_rule_keyword_route(category: str, keyword: str):
+    await run_blocking(delete_rule_keyword, category, keyword)
+    rules.invalidate()
+    return RedirectResponse("/rules", status_code=302)
+
+
 # -----------------------------
 # LOGIN + OAUTH
 # -----------------------------
 @app.get("/login")
-def login():
-    flow = Flow.from_client_secrets_file(
+async def login():
+    flow = await run_blocking(
+        Flow.from_client_secrets_file,
         CLIENT_SECRETS_FILE,
         SCOPES,
         redirect_uri="http://localhost:8080/oauth2callback"
@@ -299,107 +475,279 @@ def login():
 
 
 @app.get("/oauth2callback")
-def oauth_callback(request: Request):
+async def oauth_callback(request: Request):
     state = request.query_params.get("state")
 
-    flow = Flow.from_client_secrets_file(
+    flow = await run_blocking(
+        Flow.from_client_secrets_file,
         CLIENT_SECRETS_FILE,
         SCOPES,
         state=state,
         redirect_uri="http://localhost:8080/oauth2callback"
     )
 
-    flow.fetch_token(authorization_response=str(request.url))
-    save_credentials(flow.credentials)
+    await run_blocking(flow.fetch_token, authorization_response=str(request.url))
+    email = await run_blocking(credentials.login, flow.credentials)
+
+    job = jobs.submit(email, "label", run_labeling, email, LOGIN_SAMPLE)
+    response = RedirectResponse(f"/jobs/{job.id}", status_code=302)
+    response.set_cookie(
+        SESSION_COOKIE, sign_session(email),
+        max_age=SESSION_MAX_AGE, httponly=True, samesite="lax"
+    )
+    return response
+
+
+# -----------------------------
+# BACKGROUND LABELING JOB
+# -----------------------------
+# Messages sampled at login to pre-classify sender domains
+LOGIN_SAMPLE = 100
+
 
-    service = build("gmail", "v1", credentials=flow.credentials)
-    email = service.users().getProfile(userId="me").execute()["emailAddress"]
+def run_labeling(job, email, sample=0):
+    # per-thread service from the credential manager (not thread-safe to share)
+    service = credentials.service(email)
+    if service is None:
+        raise RuntimeError(f"No credentials for {email}")
 
-    # Collect domains from 100 messages
-    messages_100 = service.users().messages().list(
-        userId="me", maxResults=100
-    ).execute().get("messages", [])
+    # Collect domains from the latest `sample` messages
+    sample_ids = []
+    if sample:
+        sample_ids = [
+            msg["id"] for msg in service.users().messages().list(
+                userId="me", maxResults=sample
+            ).execute().get("messages", [])
+        ]
 
-    domains = set()
-    for msg in messages_100:
-        data = service.users().messages().get(
-            userId="me", id=msg["id"], format="metadata", metadataHeaders=["From"]
-        ).execute()
+    # Label only mail added since the last sync (last 20 on first login)
+    new_ids, history_id = list_new_messages(service, "me", email, "label")
+    job.progress("listed", sample=len(sample_ids), new=len(new_ids))
 
-        fr = next((h["value"] for h in data["payload"]["headers"] if h["name"]=="From"), "")
-        m = re.search(r"<([^>]+)>", fr)
-        pure = m.group(1) if m else fr
+    # One fetch for both stages: apply_labels reads these records from the cache
+    sampled, _ = load_records(service, "me", email, list(dict.fromkeys(sample_ids + new_ids)))
+    job.progress("fetched", messages=len(sampled))
 
-        domains.add(extract_domain(pure))
+    domains = {sampled[mid].domain for mid in sample_ids + new_ids if mid in sampled}
 
     entertainment_cache = ai_classify_domains(list(domains))
+    job.progress("classified_domains", domains=len(domains))
 
-    # Label last 20 messages
-    last20 = service.users().messages().list(
-        userId="me", maxResults=20
-    ).execute().get("messages", [])
+    results = apply_labels(service, "me", email, [{"id": mid} for mid in new_ids], entertainment_cache)
 
-    results = apply_labels(service, "me", last20, entertainment_cache)
+    # fetch or label failures → same history range again next run, until
+    # they are parked; deleted messages (404) are simply done
+    failures = {mid: r["error"] for mid, r in results.items() if "error" in r and not is_gone(r)}
+    retry, parked = finish_sync(email, "label", history_id, failures)
+    job.progress("labeled", messages=len(results), failed=len(failures), parked=len(parked))
 
-    html = f"<h2>Logged in as {email}</h2>"
-    html += "<p><a href='/draft_all'>Generate Auto Replies</a></p><br>"
-    html += "<h3>🏷 Label Results</h3>"
+    return {"email": email, "labels": results, "retry": retry, "parked": parked, "synced": not retry}
 
-    for mid, info in results.items():
-        html += f"<p><b>{mid}</b> → {info['category']} ({info['confidence']}%)<br>{info['reason']}</p>"
 
-    return HTMLResponse(html)
+# -----------------------------
+# FULL-MAILBOX BACKFILL JOB
+# -----------------------------
+def run_mailbox_backfill(job, email, restart=False):
+    service = credentials.service(email)
+    if service is None:
+        raise RuntimeError(f"No credentials for {email}")
+
+    def label_page(ids):
+        records, _ = load_records(service, "me", email, ids)
+
+        # the model only sees domains that neither the DB nor the rules settle
+        domains = {
+            r.domain for r in records.values()
+            if not get_domain_label(r.domain) and rule_based(r.subject, r.sender)[0] is None
+        }
+        entertainment_cache = ai_classify_domains(list(domains))
+
+        return apply_labels(service, "me", email, [{"id": mid} for mid in ids], entertainment_cache)
+
+    return run_backfill(
+        service, "me", email, label_page,
+        progress=lambda **data: job.progress("page", **data),
+        restart=restart
+    )
+
+
+@app.get("/backfill")
+async def backfill(request: Request, restart: bool = False):
+    account = current_account(request)
+    if not account:
+        return {"error": "Login again"}
+
+    if backfill_queue.active(account, "backfill"):
+        return JSONResponse({"error": "Backfill already running"}, status_code=409)
+
+    # own lane: the account's label and draft jobs keep running meanwhile
+    job = backfill_queue.submit(account, "backfill", run_mailbox_backfill, account, restart)
+    return RedirectResponse(f"/jobs/{job.id}", status_code=302)
+
+
+# -----------------------------
+# BACKGROUND DRAFTING JOB
+# -----------------------------
+def run_drafting(job, email):
+    # drafting is async (model calls); run it on the app's event loop
+    future = asyncio.run_coroutine_threadsafe(draft_new_messages(email), app.state.loop)
+    result = future.result()
+    job.progress("drafted", drafted=len(result.get("drafted", [])))
+    return result
+
+
+# Every connected account gets a label and a draft pass each interval
+scheduler = Scheduler(jobs, [("label", run_labeling), ("draft", run_drafting)])
+
+
+# -----------------------------
+# JOB STATUS
+# -----------------------------
+def own_job(request, job_id):
+    # another account's job is reported as unknown, not as forbidden
+    job = get_job(job_id)
+    if job and job.account == current_account(request):
+        return job
+    return None
+
+
+@app.get("/jobs/{job_id}")
+async def job_stream(job_id: str, request: Request):
+    job = own_job(request, job_id)
+    if not job:
+        return JSONResponse({"error": "Unknown job"}, status_code=404)
+
+    # NDJSON: one progress event per line until the job is done or failed
+    return StreamingResponse(job.stream(), media_type="application/x-ndjson")
+
+
+@app.get("/jobs/{job_id}/status")
+async def job_status(job_id: str, request: Request):
+    job = own_job(request, job_id)
+    if not job:
+        return JSONResponse({"error": "Unknown job"}, status_code=404)
+
+    return job.snapshot()
+
+
+# -----------------------------
+# GMAIL I/O FROM ASYNC ROUTES
+# -----------------------------
+async def gmail(account, fn, *args, **kwargs):
+    """
+    Runs fn(service, *args) on the I/O pool with the account's Gmail
+    client that belongs to the worker thread, so a client's connection is
+    never used by two threads at once. Calls made with an explicit
+    http=new_http(...) (drafting) can use any service object.
+    """
+
+    return await run_blocking(lambda: fn(credentials.service(account), *args, **kwargs))
 
 
 # -----------------------------
 # SINGLE MESSAGE DRAFT
 # -----------------------------
 @app.get("/draft/{message_id}")
-def draft_reply(message_id: str):
-    creds = load_credentials()
+async def draft_reply(message_id: str, request: Request):
+    account = current_account(request)
+    creds = account and await run_blocking(credentials.get, account)
     if not creds:
         return {"error": "Login again"}
 
-    service = build("gmail", "v1", credentials=creds)
+    # Headers first: ineligible messages never have their thread downloaded
+    loaded, errors = await gmail(account, load_records, "me", account, [message_id])
+    if message_id not in loaded:
+        return {"error": f"Fetch failed: {errors.get(message_id)}"}
 
-    message = service.users().messages().get(
-        userId="me", id=message_id, format="full"
-    ).execute()
-
-    return generate_reply_and_save(service, message)
+    service = await run_blocking(credentials.service, account)
+    return await generate_reply_and_save(service, loaded[message_id], http=new_http(creds))
 
 
 # -----------------------------
-# AUTO DRAFT LAST 20 EMAILS
+# AUTO DRAFT NEW EMAILS (since last run)
 # -----------------------------
+# Model calls + draft creation run concurrently, at most this many at once
+DRAFT_CONCURRENCY = 5
+# Seconds per model call; slower ones are reported under "failed"
+DRAFT_TIMEOUT = 60
+
+
 @app.get("/draft_all")
-def draft_all():
-    creds = load_credentials()
-    if not creds:
+async def draft_all(request: Request):
+    account = current_account(request)
+    if not account:
         return {"error": "Login again"}
 
-    service = build("gmail", "v1", credentials=creds)
+    # one drafting pass per account at a time, shared with the scheduler
+    if jobs.active(account, "draft"):
+        return JSONResponse({"error": "Drafting already running"}, status_code=409)
 
-    last20 = service.users().messages().list(
-        userId="me", maxResults=20
-    ).execute().get("messages", [])
+    job = jobs.submit(account, "draft", run_drafting, account)
+    return RedirectResponse(f"/jobs/{job.id}", status_code=302)
 
-    drafted, skipped = [], []
 
-    for msg in last20:
-        full = service.users().messages().get(
-            userId="me", id=msg["id"], format="full"
-        ).execute()
+async def draft_new_messages(account):
+    creds = await run_blocking(credentials.get, account)
+    if not creds:
+        return {"error": "Login again"}
 
-        res = generate_reply_and_save(service, full)
+    service = await run_blocking(credentials.service, account)
 
+    new_ids, history_id = await gmail(account, list_new_messages, "me", account, "draft")
+
+    # Gmail search drops most ineligible mail before any fetch, then the
+    # header rules run on metadata; threads are fetched for eligible mail only
+    candidates = await gmail(account, list_candidate_ids, "me")
+    loaded, errors = await gmail(
+        account, load_records, "me", account, [mid for mid in new_ids if mid in candidates]
+    )
+
+    drafted, skipped = [], []
+    failed = [
+        {"message_id": mid, "error": f"Fetch failed: {exc}", "status": error_status(exc)}
+        for mid, exc in errors.items()
+    ]
+    eligible = []
+
+    for record in loaded.values():
+        skip = check_eligibility(record)
+        if skip:
+            skipped.append(skip)
+        else:
+            eligible.append(record)
+
+    sem = asyncio.Semaphore(DRAFT_CONCURRENCY)
+
+    async def draft_one(record):
+        async with sem:
+            try:
+                return await generate_reply_and_save(
+                    service, record, http=new_http(creds), model_timeout=DRAFT_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                return {"message_id": record.id, "error": f"Model timed out after {DRAFT_TIMEOUT}s"}
+            except Exception as e:
+                return {"message_id": record.id, "error": str(e), "status": error_status(e)}
+
+    for res in await asyncio.gather(*(draft_one(r) for r in eligible)):
         if res.get("eligible"):
             drafted.append(res)
+        elif "error" in res:
+            failed.append(res)
         else:
             skipped.append(res)
 
+    # failed messages come back in the next pass until they are parked
+    # (drafted ones are remembered per message, so not drafted twice)
+    failures = {f["message_id"]: f["error"] for f in failed if not is_gone(f)}
+    retry, parked = await run_blocking(finish_sync, account, "draft", history_id, failures)
+
     return {
-        "processed": len(last20),
+        "processed": len(new_ids),
+        "prefiltered": len(new_ids) - len(loaded) - len(errors),
         "drafted": drafted,
-        "skipped": skipped
+        "skipped": skipped,
+        "failed": failed,
+        "parked": parked,
+        "synced": not retry
     }
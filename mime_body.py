@@ -0,0 +1,171 @@
+# mime_body.py
+
+import base64
+import binascii
+import re
+from html.parser import HTMLParser
+
+# Raw bytes decoded per message body, and characters of text kept.
+# Enough for the part of an email a reply is based on; the rest of a
+# bloated newsletter is never decoded or parsed.
+BODY_BYTE_BUDGET = 64 * 1024
+BODY_CHAR_LIMIT = 8000
+
+# Text is handed to the HTML tokenizer in slices this big, so it can stop
+# as soon as enough visible text was collected
+FEED_CHUNK = 8192
+
+CHARSET_RE = re.compile(r'charset="?([\w.-]+)"?', re.I)
+BLANK_LINES_RE = re.compile(r"\n\s*\n+")
+SPACES_RE = re.compile(r"[ \t\r\f\v]+")
+
+
+# --------------------------
+# PICK THE BEST PART
+# --------------------------
+def find_part(payload):
+    """
+    Walks the MIME tree (iteratively) and returns the first text/plain
+    part with inline data, else the first text/html one, else None.
+    Attachments (parts with a filename) are skipped.
+    """
+
+    html = None
+    stack = [payload]
+
+    while stack:
+        part = stack.pop()
+        if part.get("parts"):
+            # reversed so parts are visited in document order
+            stack.extend(reversed(part["parts"]))
+            continue
+
+        if part.get("filename") or "data" not in part.get("body", {}):
+            continue
+
+        mime = part.get("mimeType", "")
+        if mime == "text/plain":
+            return part
+        if mime == "text/html" and html is None:
+            html = part
+        elif html is None and not mime:
+            # single-part messages sometimes carry no mimeType on the body
+            html = part
+
+    return html
+
+
+def part_charset(part):
+    for h in part.get("headers", []):
+        if h["name"].lower() == "content-type":
+            m = CHARSET_RE.search(h["value"])
+            if m:
+                return m.group(1)
+    return "utf-8"
+
+
+# --------------------------
+# BOUNDED BASE64URL DECODE
+# --------------------------
+def decode_prefix(data, max_bytes=BODY_BYTE_BUDGET):
+    """
+    Decodes at most `max_bytes` bytes from the start of a base64url
+    string without decoding the rest of it.
+    """
+
+    chars = -(-max_bytes // 3) * 4
+    chunk = data[:chars]
+    chunk += "=" * (-len(chunk) % 4)
+
+    try:
+        return base64.urlsafe_b64decode(chunk)[:max_bytes]
+    except (binascii.Error, ValueError):
+        return b""
+
+
+# --------------------------
+# STREAMING HTML → TEXT
+# --------------------------
+class TextExtractor(HTMLParser):
+    SKIP = {"script", "style", "head", "title", "noscript", "template"}
+    BREAKS = {"br", "p", "div", "tr", "li", "h1", "h2", "h3", "h4", "h5", "h6", "table", "blockquote"}
+
+    def __init__(self, limit):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.size = 0
+        self.skip_depth = 0
+        self.out = []
+
+    @property
+    def full(self):
+        return self.size >= self.limit
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.skip_depth += 1
+        elif tag in self.BREAKS:
+            self.out.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self.skip_depth:
+            self.skip_depth -= 1
+        elif tag in self.BREAKS:
+            self.out.append("\n")
+
+    def handle_data(self, data):
+        if self.skip_depth or self.full:
+            return
+        self.out.append(data)
+        self.size += len(data)
+
+
+def html_to_text(html, limit=BODY_CHAR_LIMIT):
+    """
+    Strips tags with html.parser's incremental tokenizer (no DOM), fed in
+    FEED_CHUNK slices and stopped once `limit` characters are collected.
+    """
+
+    parser = TextExtractor(limit)
+    for i in range(0, len(html), FEED_CHUNK):
+        parser.feed(html[i:i+FEED_CHUNK])
+        if parser.full:
+            break
+    parser.close()
+
+    return normalize("".join(parser.out), limit)
+
+
+def normalize(text, limit=BODY_CHAR_LIMIT):
+    text = SPACES_RE.sub(" ", text)
+    text = BLANK_LINES_RE.sub("\n\n", text)
+    return "\n".join(line.strip() for line in text.split("\n")).strip()[:limit]
+
+
+# --------------------------
+# PAYLOAD → PLAIN TEXT
+# --------------------------
+def extract_text(payload, max_bytes=BODY_BYTE_BUDGET, limit=BODY_CHAR_LIMIT):
+    """
+    payload = Gmail message["payload"] from format="full"
+
+    Returns readable text of the message body: text/plain preferred,
+    otherwise stripped HTML. At most `max_bytes` raw bytes are decoded
+    and at most `limit` characters returned, however large the email is.
+    """
+
+    part = find_part(payload)
+    if part is None:
+        return ""
+
+    raw = decode_prefix(part["body"]["data"], max_bytes)
+
+    try:
+        text = raw.decode(part_charset(part), errors="ignore")
+    except LookupError:
+        text = raw.decode("utf-8", errors="ignore")
+
+    if part.get("mimeType") == "text/plain":
+        return normalize(text, limit)
+
+    return html_to_text(text, limit)
@@ -0,0 +1,114 @@
+# pipeline.py
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from gmail_batch import fetch_messages, parse_headers
+from senders import extract_domain, parse_sender
+
+HEADERS = ("Subject", "From", "Date")
+
+# Records kept in memory across requests (parsed headers only)
+CACHE_SIZE = 5000
+
+
+# --------------------------
+# PER-MESSAGE RECORD
+# --------------------------
+@dataclass(slots=True)
+class MessageRecord:
+    account: str
+    id: str
+    thread_id: str
+    subject: str
+    sender_raw: str
+    sender: str
+    domain: str
+    date: str
+    internal_date: int
+
+
+def to_record(message, account):
+    headers = parse_headers(message, HEADERS)
+    sender = parse_sender(headers["from"])
+
+    return MessageRecord(
+        account=account,
+        id=message["id"],
+        thread_id=message.get("threadId", ""),
+        subject=headers["subject"],
+        sender_raw=headers["from"],
+        sender=sender,
+        domain=extract_domain(sender),
+        date=headers["date"],
+        internal_date=int(message.get("internalDate", 0)),
+    )
+
+
+# --------------------------
+# SHARED RECORD CACHE (LRU)
+# --------------------------
+class RecordCache:
+    """LRU of MessageRecords keyed by (account, message id)."""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.records = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, account, mid):
+        key = (account, mid)
+        with self.lock:
+            record = self.records.get(key)
+            if record is not None:
+                self.records.move_to_end(key)
+            return record
+
+    def put(self, record):
+        key = (record.account, record.id)
+        with self.lock:
+            self.records[key] = record
+            self.records.move_to_end(key)
+            while len(self.records) > self.size:
+                self.records.popitem(last=False)
+
+
+records = RecordCache()
+
+
+# --------------------------
+# LOAD RECORDS (fetch once)
+# --------------------------
+def load_records(service, user_id, account, message_ids, cache=records):
+    """
+    Returns:
+        loaded, errors
+        loaded = {message_id: MessageRecord}
+        errors = {message_id: exception}
+
+    Messages already in the cache for this account (message ids are only
+    unique per mailbox) are not fetched again. Missing ones are
+    fetched in Gmail batches with format="metadata"; drafting reads bodies
+    from the thread instead (thread_context.py). Domain sampling, labeling
+    and drafting all read the same records.
+    """
+
+    loaded, missing = {}, []
+
+    for mid in message_ids:
+        record = cache.get(account, mid)
+        if record is None:
+            missing.append(mid)
+        else:
+            loaded[mid] = record
+
+    fetched, errors = fetch_messages(service, user_id, missing, headers=HEADERS)
+
+    for mid, message in fetched.items():
+        record = to_record(message, account)
+        cache.put(record)
+        loaded[mid] = record
+
+    # keep the caller's order
+    return {mid: loaded[mid] for mid in message_ids if mid in loaded}, errors
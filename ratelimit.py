@@ -0,0 +1,59 @@
+# ratelimit.py
+
+import random
+import threading
+import time
+
+
+# --------------------------
+# TOKEN BUCKET
+# --------------------------
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, bursts of up to
+    `capacity`. acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+# --------------------------
+# RETRY WITH EXPONENTIAL BACKOFF
+# --------------------------
+def with_retries(fn, retries=3, base_delay=1.0, max_delay=30.0, bucket=None):
+    """
+    Calls fn() up to `retries + 1` times, sleeping base_delay * 2^attempt
+    (with jitter, capped at max_delay) between attempts. When a bucket is
+    given, every attempt takes a token first. Re-raises the last error.
+    """
+
+    for attempt in range(retries + 1):
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            return fn()
+        except Exception:
+            if attempt == retries:
+                raise
+            delay = min(max_delay, base_delay * (2 ** attempt))
+            time.sleep(delay * random.uniform(0.5, 1.0))
@@ -1,6 +1,10 @@
 # rules.py
 
 import re
+import threading
+import time
+
+from db import get_rules, get_rules_version, seed_rules
 
 # -------------------------------
 # CATEGORY LIST (STRICT CONTROL)
@@ -46,98 +50,360 @@ SUPPORT_WORDS = ["support", "helpdesk", "noreply@support"]
 
 URGENT_WORDS = ["urgent", "alert", "action required"]
 
+NEWSLETTER_WORDS = ["newsletter", "digest"]
+
 ENTERTAINMENT_HINTS = [
     "netflix", "hotstar", "spotify", "prime", "youtube",
     "instagram", "facebook", "reddit", "pinterest"
 ]
 
 
+# --------------------------------------------------------------
+# COMPILED KEYWORD MATCHER
+# --------------------------------------------------------------
+
+def trie_pattern(words):
+    """
+    Builds a prefix-factored regex from literal keywords, e.g.
+    ["bill", "billing", "bank"] → "b(?:ank|ill(?:ing)?)". Python's re
+    tries alternatives one by one, so factoring shared prefixes keeps a
+    search to roughly one branch per text position.
+    """
+
+    trie = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        end = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not end:
+            return branches[0]
+        body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if end else body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """
+    Compiles keyword groups into combined regexes per scope ("subject" /
+    "sender") and returns the highest-priority group with a hit.
+
+    groups = [(name, keywords, scopes), ...] in priority order, where
+    scopes is a tuple of "subject" and/or "sender". Matching is plain
+    substring matching on already-lowercased text, same as `w in text`.
+
+    For each scope, below[i] is one regex over every keyword of groups
+    0..i-1 (below[n] covers all groups). A hit for group i means only
+    below[i] still has to be searched, so a lookup is one C-level search
+    per scope plus one more per higher-priority group actually present.
+    """
+
+    def __init__(self, groups):
+        self.names = [name for name, _, _ in groups]
+        self.patterns = {}
+
+        for scope in ("subject", "sender"):
+            # keyword → highest-priority group that lists it
+            owner = {}
+            for i, (_, words, scopes) in enumerate(groups):
+                if scope in scopes:
+                    for w in words:
+                        owner.setdefault(w.lower(), i)
+
+            below = []
+            for i in range(len(groups) + 1):
+                words = [w for w, idx in owner.items() if idx < i]
+                below.append(re.compile(trie_pattern(words)) if words else None)
+
+            self.patterns[scope] = (owner, below)
+
+    def scan(self, scope: str, text: str, best=None):
+        """
+        Returns the highest-priority group index hit in `text` for one
+        scope, considering only groups above `best` (None = all groups).
+        """
+
+        owner, below = self.patterns[scope]
+        best = len(self.names) if best is None else best
+
+        pattern = below[best]
+        while pattern is not None:
+            m = pattern.search(text)
+            if m is None:
+                break
+            best = owner[m.group()]
+            pattern = below[best]
+
+        return best if best < len(self.names) else None
+
+    def first(self, subject_l: str, sender_l: str):
+        """
+        Returns the index of the highest-priority group with a hit, or None.
+        """
+
+        best = self.scan("subject", subject_l)
+        return self.scan("sender", sender_l, best)
+
+    def first_name(self, subject_l: str, sender_l: str):
+        idx = self.first(subject_l, sender_l)
+        return None if idx is None else self.names[idx]
+
+
+# --------------------------------------------------------------
+# DEFAULT RULES (seed for the rules table)
+# --------------------------------------------------------------
+
+# (category, confidence, reason, keywords, scopes) in priority order.
+# "Personal" has no keywords: its position marks where the Gmail
+# personal-sender check runs, see rule_based_classify.
+DEFAULT_RULES = [
+    ("Finance", 90, "Rule-based: Finance keywords matched", FINANCE_WORDS, ("subject", "sender")),
+    ("Bills", 90, "Rule-based: Bill keywords matched", BILL_WORDS, ("subject", "sender")),
+    ("Promotions/Offers", 85, "Rule-based: Promotion keywords matched", PROMOTION_WORDS, ("subject",)),
+    ("Career", 85, "Rule-based: Career keywords matched", CAREER_WORDS, ("subject",)),
+    ("Work", 80, "Rule-based: Work keyword matched", WORK_WORDS, ("subject",)),
+    ("Travel", 85, "Rule-based: Travel keyword matched", TRAVEL_WORDS, ("subject",)),
+    ("Support", 70, "Rule-based: Support sender", SUPPORT_WORDS, ("sender",)),
+    ("Urgent", 90, "Rule-based: Urgent keyword", URGENT_WORDS, ("subject",)),
+    ("Newsletter", 60, "Rule-based: Newsletter sender detected", NEWSLETTER_WORDS, ("sender",)),
+    ("Personal", 50, "Rule-based: Gmail personal sender", [], ()),
+    ("Entertainment", 95, "Rule-based: Known entertainment platform", ENTERTAINMENT_HINTS, ("sender",)),
+]
+
+# Bump whenever DEFAULT_RULES changes so existing databases pick it up
+RULES_SEED_VERSION = 1
+
+PERSONAL = "Personal"
+
+# Gmail senders that are businesses, not people
+PERSONAL_BLOCKED = ["amazon", "flipkart", "zomato", "swiggy", "ola"]
+
+UNKNOWN_RESULT = ("UNKNOWN_CHECK_ENTERTAINMENT", 40, "Possible entertainment domain — AI check needed")
+
+# Seconds a compiled rule set is used before the stored version is
+# compared again (edits made in this process apply immediately)
+RULES_CHECK_INTERVAL = 5.0
+
+
+# --------------------------------------------------------------
+# COMPILED RULE SET (immutable) + HOT SWAP
+# --------------------------------------------------------------
+
+class RuleSet:
+    """
+    One compiled version of the rules. Never modified after it is built:
+    a rule change builds a new RuleSet and the repository swaps the
+    reference, so classification reads it without taking a lock.
+    """
+
+    def __init__(self, rules, version=0):
+        self.version = version
+        # an empty keyword would match every text; never compile one
+        self.rules = tuple(
+            (category, conf, reason, tuple(w for w in words if w.strip()), tuple(scopes))
+            for category, conf, reason, words, scopes in rules
+        )
+        self.outcomes = tuple(rule[:3] for rule in self.rules)
+        self.matcher = KeywordMatcher([(cat, words, scopes) for cat, _, _, words, scopes in self.rules])
+
+        names = [rule[0] for rule in self.rules]
+        if PERSONAL in names:
+            p = names.index(PERSONAL)
+            # hits up to and including Personal win over the sender check
+            self.personal_cut = p + 1
+            self.personal_result = self.outcomes[p]
+        else:
+            self.personal_cut = 0
+            self.personal_result = None
+
+
+class RuleRepository:
+    """
+    Hands out the current RuleSet. At most every `check_every` seconds
+    one caller compares the stored rules version with the compiled one
+    and recompiles if it moved; everyone else just reads the reference.
+    Callers that lose the race for the reload keep the current RuleSet
+    instead of waiting (only the very first load blocks).
+    """
+
+    def __init__(self, check_every=RULES_CHECK_INTERVAL):
+        self.check_every = check_every
+        self.lock = threading.Lock()
+        self.ruleset = None
+        self.checked = 0.0
+
+    def current(self):
+        ruleset = self.ruleset
+        if ruleset is not None and time.monotonic() - self.checked < self.check_every:
+            return ruleset
+        return self._reload()
+
+    def invalidate(self):
+        # next current() re-reads the version
+        self.checked = 0.0
+
+    def _reload(self):
+        if not self.lock.acquire(blocking=self.ruleset is None):
+            # another caller is reloading; the current rules are fine meanwhile
+            return self.ruleset
+
+        try:
+            now = time.monotonic()
+            if self.ruleset is not None and now - self.checked < self.check_every:
+                return self.ruleset
+
+            try:
+                if self.ruleset is None or get_rules_version() != self.ruleset.version:
+                    version, rules = get_rules()
+                    # an unseeded database classifies with the defaults
+                    self.ruleset = RuleSet(rules, version) if rules else RuleSet(DEFAULT_RULES, version)
+            except Exception as e:
+                if self.ruleset is None:
+                    raise
+                print(f"Rule reload failed, keeping version {self.ruleset.version}: {e}")
+
+            self.checked = now
+            return self.ruleset
+        finally:
+            self.lock.release()
+
+
+repository = RuleRepository()
+
+
+def init_rules():
+    """Seeds the rules table from DEFAULT_RULES (once per seed version)."""
+    seed_rules(DEFAULT_RULES, RULES_SEED_VERSION)
+    repository.invalidate()
+
+
 # --------------------------------------------------------------
 # RULE-BASED CLASSIFICATION (STRICT + CONTROLLED)
 # --------------------------------------------------------------
 
-def rule_based_classify(subject: str, sender: str):
+def is_personal_sender(sender_l: str):
+    return sender_l.endswith("@gmail.com") and not any(b in sender_l for b in PERSONAL_BLOCKED)
+
+
+def rule_based_classify(subject: str, sender: str, ruleset=None):
     """
     Returns:
         category, confidence, reason
         OR
         ("UNKNOWN_CHECK_ENTERTAINMENT", 40, ...) → means AI must verify domain
+
+    Priority is the stored rule order; by default Finance, Bills,
+    Promotions, Career, Work, Travel, Support, Urgent, Newsletter
+    (detected but NOT applied — main.py will skip), Personal (detected
+    but NOT applied), Entertainment.
     """
 
+    ruleset = ruleset or repository.current()
+
     subject_l = subject.lower()
     sender_l = sender.lower()
 
-    # -----------------------
-    # FINANCE
-    # -----------------------
-    if any(w in subject_l or w in sender_l for w in FINANCE_WORDS):
-        return "Finance", 90, "Rule-based: Finance keywords matched"
+    idx = ruleset.matcher.first(subject_l, sender_l)
 
-    # -----------------------
-    # BILLS
-    # -----------------------
-    if any(w in subject_l or w in sender_l for w in BILL_WORDS):
-        return "Bills", 90, "Rule-based: Bill keywords matched"
+    if idx is not None and idx < ruleset.personal_cut:
+        return ruleset.outcomes[idx]
 
-    # -----------------------
-    # PROMOTIONS
-    # -----------------------
-    if any(w in subject_l for w in PROMOTION_WORDS):
-        return "Promotions/Offers", 85, "Rule-based: Promotion keywords matched"
+    if ruleset.personal_result and is_personal_sender(sender_l):
+        return ruleset.personal_result
 
-    # -----------------------
-    # CAREER
-    # -----------------------
-    if any(w in subject_l for w in CAREER_WORDS):
-        return "Career", 85, "Rule-based: Career keywords matched"
+    if idx is not None:
+        return ruleset.outcomes[idx]
 
     # -----------------------
-    # WORK (meetings, deadlines, projects)
+    # UNKNOWN → Send to Gemini to check ONLY entertainment domain
     # -----------------------
-    if any(w in subject_l for w in WORK_WORDS):
-        return "Work", 80, "Rule-based: Work keyword matched"
+    return UNKNOWN_RESULT
+# --------------------------------------------------------------
+# BULK CLASSIFICATION (columnar input)
+# --------------------------------------------------------------
 
-    # -----------------------
-    # TRAVEL
-    # -----------------------
-    if any(w in subject_l for w in TRAVEL_WORDS):
-        return "Travel", 85, "Rule-based: Travel keyword matched"
 
-    # -----------------------
-    # SUPPORT
-    # -----------------------
-    if any(w in sender_l for w in SUPPORT_WORDS):
-        return "Support", 70, "Rule-based: Support sender"
+def _as_list(column):
+    # pyarrow arrays / chunked arrays, NumPy arrays, then any iterable
+    if hasattr(column, "to_pylist"):
+        return column.to_pylist()
+    if hasattr(column, "tolist"):
+        return column.tolist()
+    return list(column)
 
-    # -----------------------
-    # URGENT
-    # -----------------------
-    if any(w in subject_l for w in URGENT_WORDS):
-        return "Urgent", 90, "Rule-based: Urgent keyword"
 
-    # -----------------------
-    # NEWSLETTER
-    # (Detected but NOT applied — main.py will skip)
-    # -----------------------
-    if "newsletter" in sender_l or "digest" in sender_l:
-        return "Newsletter", 60, "Rule-based: Newsletter sender detected"
+def classify_many(subjects, senders, ruleset=None):
+    """
+    Bulk version of rule_based_classify over columnar input.
 
-    # -----------------------
-    # PERSONAL — detected but NOT applied
-    # -----------------------
-    if sender_l.endswith("@gmail.com"):
-        # Exclude obvious businesses
-        blocked = ["amazon", "flipkart", "zomato", "swiggy", "ola"]
-        if not any(b in sender_l for b in blocked):
-            return "Personal", 50, "Rule-based: Gmail personal sender"
+    subjects, senders = equal-length lists, NumPy string arrays or pyarrow
+    string arrays (nulls are treated as "").
 
-    # -----------------------
-    # DIRECT ENTERTAINMENT DOMAINS
-    # -----------------------
-    if any(hint in sender_l for hint in ENTERTAINMENT_HINTS):
-        return "Entertainment", 95, "Rule-based: Known entertainment platform"
+    Returns:
+        categories, confidences, reasons — three lists, row i equal to
+        rule_based_classify(subjects[i], senders[i])
 
-    # -----------------------
-    # UNKNOWN → Send to Gemini to check ONLY entertainment domain
-    # -----------------------
-    return "UNKNOWN_CHECK_ENTERTAINMENT", 40, "Possible entertainment domain — AI check needed"
+    Each distinct sender and each distinct subject is lowercased and
+    scanned once, so repeated senders (the common case in a mailbox
+    export) cost a dict lookup per row.
+    """
+
+    subjects = _as_list(subjects)
+    senders = _as_list(senders)
+    if len(subjects) != len(senders):
+        raise ValueError("subjects and senders must have the same length")
+
+    # one rule set for the whole call, even if the rules change meanwhile
+    ruleset = ruleset or repository.current()
+    matcher = ruleset.matcher
+    outcomes = ruleset.outcomes
+    n_rules = len(outcomes)
+    personal_cut, personal_result = ruleset.personal_cut, ruleset.personal_result
+
+    subject_hits = {}
+    # sender → (best sender-scope hit as an int, is personal)
+    sender_hits = {}
+
+    categories, confidences, reasons = [], [], []
+    add_cat, add_conf, add_reason = categories.append, confidences.append, reasons.append
+
+    for subject, sender in zip(subjects, senders):
+        subject = subject or ""
+        sender = sender or ""
+
+        s_idx = subject_hits.get(subject)
+        if s_idx is None:
+            s_idx = matcher.scan("subject", subject.lower())
+            s_idx = n_rules if s_idx is None else s_idx
+            subject_hits[subject] = s_idx
+
+        f = sender_hits.get(sender)
+        if f is None:
+            sender_l = sender.lower()
+            f_idx = matcher.scan("sender", sender_l)
+            f = (n_rules if f_idx is None else f_idx, is_personal_sender(sender_l))
+            sender_hits[sender] = f
+
+        idx = s_idx if s_idx < f[0] else f[0]
+
+        if idx < personal_cut:
+            result = outcomes[idx]
+        elif f[1] and personal_result:
+            result = personal_result
+        elif idx < n_rules:
+            result = outcomes[idx]
+        else:
+            result = UNKNOWN_RESULT
+
+        add_cat(result[0])
+        add_conf(result[1])
+        add_reason(result[2])
+
+    return categories, confidences, reasons
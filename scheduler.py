@@ -0,0 +1,62 @@
+# scheduler.py
+
+import threading
+import time
+
+from db import list_accounts
+
+# Seconds between sync passes over all connected accounts
+SYNC_INTERVAL = 300
+
+
+# --------------------------
+# PERIODIC PER-ACCOUNT SYNC
+# --------------------------
+class Scheduler:
+    """
+    Every `interval` seconds, submits one job per (account, task) to the
+    job queue, for every account with stored credentials. A task that is
+    still queued or running for an account is not submitted again, so a
+    slow mailbox never piles up work.
+
+    Fairness comes from the queue: each account runs at most
+    `per_account` jobs at once and its other jobs re-enter the pool
+    behind everyone else's, and the starting account rotates every pass
+    so no mailbox is always first in line.
+    """
+
+    def __init__(self, queue, tasks, interval=SYNC_INTERVAL):
+        # tasks = [(job name, fn(job, account))]
+        self.queue = queue
+        self.tasks = tasks
+        self.interval = interval
+        self.offset = 0
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+            self.thread.start()
+
+    def tick(self):
+        accounts = list_accounts()
+        if not accounts:
+            return []
+
+        self.offset = (self.offset + 1) % len(accounts)
+        accounts = accounts[self.offset:] + accounts[:self.offset]
+
+        submitted = []
+        for name, fn in self.tasks:
+            for account in accounts:
+                if not self.queue.active(account, name):
+                    submitted.append(self.queue.submit(account, name, fn, account))
+        return submitted
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Scheduler pass failed: {e}")
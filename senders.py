@@ -0,0 +1,123 @@
+# senders.py
+
+import re
+from email.utils import parseaddr
+from functools import lru_cache
+
+# Distinct From headers and domains seen per process are few compared to
+# messages, so both parsers are memoized
+SENDER_CACHE_SIZE = 20000
+DOMAIN_CACHE_SIZE = 20000
+
+# Fast paths for the two shapes nearly every header has:
+#   Display Name <addr@domain>   (the last <...> wins, so a quoted name
+#                                 containing "<x@y>" is not mistaken for it)
+#   addr@domain
+ANGLE_ADDR_RE = re.compile(r"<\s*([^<>\s@]+@[^<>\s@]+)\s*>\s*$")
+BARE_ADDR_RE = re.compile(r"^\s*([^\s<>\"(),;:@]+@[^\s<>\"(),;:@]+)\s*$")
+
+
+# --------------------------
+# FROM HEADER → ADDRESS
+# --------------------------
+@lru_cache(maxsize=SENDER_CACHE_SIZE)
+def parse_sender(sender_raw):
+    """
+    Returns the mailbox address of a From header value. Headers the fast
+    patterns do not cover (comments, quoted local parts, groups) go
+    through email.utils.parseaddr; unparseable ones are returned as is.
+    """
+
+    m = ANGLE_ADDR_RE.search(sender_raw) or BARE_ADDR_RE.match(sender_raw)
+    if m:
+        return m.group(1)
+
+    _, address = parseaddr(sender_raw)
+    return address or sender_raw.strip()
+
+
+# --------------------------
+# ADDRESS → DOMAIN
+# --------------------------
+@lru_cache(maxsize=DOMAIN_CACHE_SIZE)
+def normalize_domain(domain):
+    """
+    Lowercases and strips a domain ("Mail.Netflix.COM." → "mail.netflix.com",
+    ".netflix.com" → "netflix.com"), and converts internationalized names
+    to their ASCII (punycode) form so they compare equal to what is stored.
+    """
+
+    domain = domain.strip().strip("[]").strip(".").lower()
+    if not domain.isascii():
+        try:
+            domain = domain.encode("idna").decode("ascii")
+        except UnicodeError:
+            pass
+    return domain
+
+
+def is_valid_domain(domain):
+    # a normalized domain with no empty label ("a..b.com")
+    return bool(domain) and "" not in domain.split(".")
+
+
+def extract_domain(email):
+    if "@" not in email:
+        return ""
+    return normalize_domain(email.rpartition("@")[2])
+
+
+# --------------------------
+# SUFFIX TRIE: DOMAIN → MOST SPECIFIC PARENT
+# --------------------------
+class DomainIndex:
+    """
+    Trie over domain labels, right to left (com → netflix → mail), built
+    from (domain, value) pairs. lookup("mail.netflix.com") returns the
+    value stored for the longest registered suffix, here "netflix.com",
+    walking one node per label.
+
+    add/remove change it in place, one dict operation at a time, so
+    lookups may run while a single writer (holding its own lock) edits.
+    """
+
+    VALUE = None  # key holding a node's value; labels are strings, even empty ones
+
+    def __init__(self, items=()):
+        self.root = {}
+        for domain, value in items:
+            self.add(domain, value)
+
+    def add(self, domain, value):
+        node = self.root
+        for label in reversed(normalize_domain(domain).split(".")):
+            node = node.setdefault(label, {})
+        node[self.VALUE] = value
+
+    def remove(self, domain):
+        labels = normalize_domain(domain).split(".")[::-1]
+        path = [self.root]
+        for label in labels:
+            node = path[-1].get(label)
+            if node is None:
+                return
+            path.append(node)
+
+        path[-1].pop(self.VALUE, None)
+
+        # drop nodes nothing is stored at or below any more
+        for label, parent, node in reversed(list(zip(labels, path, path[1:]))):
+            if node:
+                break
+            del parent[label]
+
+    def lookup(self, domain):
+        node = self.root
+        found = None
+        for label in reversed(domain.split(".")):
+            node = node.get(label)
+            if node is None:
+                break
+            if self.VALUE in node:
+                found = node[self.VALUE]
+        return found
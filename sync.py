@@ -0,0 +1,122 @@
+# sync.py
+
+from googleapiclient.errors import HttpError
+
+from db import (
+    get_history_id, save_history_id, record_sync_failures, get_parked_messages, clear_sync_failures,
+)
+
+# Messages picked up on the very first sync (or when Gmail no longer has
+# history for the stored id), same as the old "last 20" behaviour.
+BOOTSTRAP_SIZE = 20
+
+# Our own drafts and sent replies also show up as messageAdded
+SKIP_LABELS = {"DRAFT", "SENT"}
+
+# A message that fails in this many runs is parked: it is skipped from
+# then on and no longer holds the stream's historyId back
+MAX_ATTEMPTS = 3
+
+
+# --------------------------
+# FIRST SYNC / EXPIRED HISTORY
+# --------------------------
+def bootstrap(service, user_id, history_id, size=BOOTSTRAP_SIZE):
+    messages = service.users().messages().list(
+        userId=user_id, maxResults=size
+    ).execute().get("messages", [])
+
+    return [m["id"] for m in messages], history_id
+
+
+# --------------------------
+# NEW MESSAGES SINCE LAST SYNC
+# --------------------------
+def list_new_messages(service, user_id, account, stream):
+    """
+    Returns:
+        message_ids, history_id
+
+    Uses users.history.list from the historyId stored for
+    (account, stream), so each sync only sees mail added since the last
+    one. Each consumer (e.g. "label", "draft") keeps its own stream.
+    Call finish_sync(account, stream, history_id, failures) once the ids
+    were processed, so failed messages are picked up again next time.
+    Parked messages are left out.
+    """
+
+    ids, history_id = list_added(service, user_id, account, stream)
+    parked = get_parked_messages(account, stream, MAX_ATTEMPTS)
+    return [mid for mid in ids if mid not in parked], history_id
+
+
+def list_added(service, user_id, account, stream):
+    start = get_history_id(account, stream)
+    if start is None:
+        profile = service.users().getProfile(userId=user_id).execute()
+        return bootstrap(service, user_id, profile["historyId"])
+
+    ids, seen = [], set()
+    latest = start
+    page_token = None
+
+    try:
+        while True:
+            resp = service.users().history().list(
+                userId=user_id,
+                startHistoryId=start,
+                historyTypes=["messageAdded"],
+                pageToken=page_token
+            ).execute()
+
+            for record in resp.get("history", []):
+                for added in record.get("messagesAdded", []):
+                    msg = added["message"]
+                    if msg["id"] in seen or SKIP_LABELS & set(msg.get("labelIds", [])):
+                        continue
+                    seen.add(msg["id"])
+                    ids.append(msg["id"])
+
+            latest = resp.get("historyId", latest)
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                break
+
+    except HttpError as e:
+        # 404 → startHistoryId is too old, Gmail no longer has it
+        if e.resp.status != 404:
+            raise
+        profile = service.users().getProfile(userId=user_id).execute()
+        return bootstrap(service, user_id, profile["historyId"])
+
+    # history.list returns oldest first; callers expect newest first like messages.list
+    ids.reverse()
+    return ids, latest
+
+
+def mark_synced(account, stream, history_id):
+    save_history_id(account, stream, history_id)
+
+
+def finish_sync(account, stream, history_id, failures, max_attempts=MAX_ATTEMPTS):
+    """
+    failures = {message_id: error} for messages of this run that failed
+    and still exist (a 404 is not a failure: there is nothing left to do).
+
+    The stored historyId only moves to history_id once no failing message
+    has runs left, so those are read again next time; a message failing
+    in `max_attempts` runs is parked instead of pinning the stream.
+
+    Returns:
+        retry, parked — ids left for the next run, ids parked by this one
+    """
+
+    attempts = record_sync_failures(account, stream, failures) if failures else {}
+    retry = [mid for mid, n in attempts.items() if n < max_attempts]
+    parked = [mid for mid, n in attempts.items() if n >= max_attempts]
+
+    if not retry:
+        mark_synced(account, stream, history_id)
+        clear_sync_failures(account, stream, max_attempts)
+
+    return retry, parked
@@ -0,0 +1,130 @@
+# thread_context.py
+
+import re
+import threading
+from collections import OrderedDict
+
+from gmail_batch import parse_headers
+from mime_body import extract_text
+
+# Input token budget for the thread text handed to generate_ai_reply
+THREAD_TOKEN_BUDGET = 2000
+CACHE_SIZE = 1000
+
+# "On Mon, 1 Jan 2024 at 10:00, Bob <bob@x.com> wrote:" and friends start
+# the quoted copy of the previous message; everything after is dropped.
+QUOTE_HEADER_RE = re.compile(
+    r"^(?:On [^\n]{0,200}(?:\n[^\n]{0,200})?wrote:"
+    r"|-{2,} ?(?:Original|Forwarded) message ?-{2,}"
+    r"|From: [^\n]+\n(?:Sent|Date): )",
+    re.I | re.M,
+)
+SIGNATURE_RE = re.compile(
+    r"^(-- ?|__+|Sent from my \w+.*|Get Outlook for \w+.*)$",
+    re.M,
+)
+
+
+# --------------------------
+# CHEAP TOKEN ESTIMATE
+# --------------------------
+def estimate_tokens(text):
+    # ~4 characters per token for English text; no tokenizer download
+    return (len(text) + 3) // 4
+
+
+# --------------------------
+# STRIP QUOTES + SIGNATURES
+# --------------------------
+def strip_reply(text):
+    m = QUOTE_HEADER_RE.search(text)
+    if m:
+        text = text[:m.start()]
+
+    m = SIGNATURE_RE.search(text)
+    if m:
+        text = text[:m.start()]
+
+    lines = [line for line in text.split("\n") if not line.lstrip().startswith(">")]
+    return "\n".join(lines).strip()
+
+
+# --------------------------
+# BUDGETED CONTEXT
+# --------------------------
+def fit_turns(turns, budget=THREAD_TOKEN_BUDGET):
+    """
+    turns = thread messages as text, oldest first. Keeps the most recent
+    turns that fit in `budget` tokens (the newest is always kept, cut to
+    the budget if needed) and returns them oldest first.
+    """
+
+    kept, used = [], 0
+
+    for turn in reversed(turns):
+        cost = estimate_tokens(turn)
+        if used + cost > budget:
+            if not kept:
+                kept.append(turn[:budget * 4])
+            break
+        kept.append(turn)
+        used += cost
+
+    return "\n\n---\n\n".join(reversed(kept))
+
+
+def thread_turns(thread):
+    turns = []
+    for message in thread.get("messages", []):
+        headers = parse_headers(message, ("From", "Date"))
+        text = strip_reply(extract_text(message["payload"]))
+        if text:
+            turns.append(f"From: {headers['from']}\nDate: {headers['date']}\n\n{text}")
+    return turns
+
+
+class ContextCache:
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+
+contexts = ContextCache()
+
+
+def build_thread_context(service, user_id, record, budget=THREAD_TOKEN_BUDGET, http=None, cache=contexts):
+    """
+    Fetches record's thread once (threads.get) and returns its recent
+    turns, quotes and signatures removed, within `budget` tokens.
+
+    Cached per account and threadId; the key includes the message being
+    replied to, so a new message in the thread gets a fresh context.
+    """
+
+    key = (record.account, record.thread_id, record.id, budget)
+    context = cache.get(key)
+    if context is not None:
+        return context
+
+    thread = service.users().threads().get(
+        userId=user_id, id=record.thread_id, format="full"
+    ).execute(http=http)
+
+    context = fit_turns(thread_turns(thread), budget)
+    cache.put(key, context)
+    return context